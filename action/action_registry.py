@@ -0,0 +1,93 @@
+import threading
+from typing import Dict, Iterable, Iterator, List
+
+from action.window_action import WindowAction
+
+
+class ActionRegistry:
+    """
+    Interns window actions and numbers them with dense integer ids.
+
+    Actions are identified by their `__eq__`/`__hash__`, so the same button detected on every revisit of a
+    page maps to the first instance registered and to the same id. Ids start at 0 and are never reused.
+    Loading saved states can leave ids below `len` empty (None) until `restore` fills them.
+    """
+
+    def __init__(self):
+        self._ids: Dict[WindowAction, int] = {}
+        self._actions: List[WindowAction] = []
+        self._lock = threading.Lock()
+
+    def id_of(self, action: WindowAction) -> int:
+        """The id of `action`, registering it first if it is new."""
+        action_id = self._ids.get(action)
+        if action_id is None:
+            with self._lock:
+                action_id = self._ids.get(action)
+                if action_id is None:
+                    action_id = self._ids[action] = len(self._actions)
+                    self._actions.append(action)
+        return action_id
+
+    def ids_of(self, actions: Iterable[WindowAction]) -> List[int]:
+        return [self.id_of(action) for action in actions]
+
+    def intern(self, action: WindowAction) -> WindowAction:
+        """The registered instance equal to `action`."""
+        return self._actions[self.id_of(action)]
+
+    def _put(self, action_id: int, action: WindowAction) -> None:
+        while len(self._actions) <= action_id:
+            self._actions.append(None)
+        self._actions[action_id] = action
+        self._ids[action] = action_id
+
+    def _free(self, action_id: int) -> bool:
+        return action_id >= len(self._actions) or self._actions[action_id] is None
+
+    def place(self, action_ids: Iterable[int], actions: Iterable[WindowAction]) -> List[int]:
+        """
+        Register saved `actions` under the ids they were saved with where those are free, and return their ids.
+        An action that is already registered, or whose id is taken by another action, keeps or gets a new id.
+        """
+        with self._lock:
+            ids = []
+            for action_id, action in zip(action_ids, actions):
+                known = self._ids.get(action)
+                if known is None:
+                    known = action_id if self._free(action_id) else len(self._actions)
+                    self._put(known, action)
+                ids.append(known)
+            return ids
+
+    def restore(self, actions: Iterable[WindowAction]) -> None:
+        """
+        Register previously saved actions (`actions` in id order) so they get their ids back. The registry must
+        be empty, or only hold the same actions at the same ids (placed by loading states saved with them).
+        """
+        with self._lock:
+            for action_id, action in enumerate(actions):
+                if self._free(action_id) and action not in self._ids:
+                    self._put(action_id, action)
+                elif self._ids.get(action) != action_id:
+                    raise RuntimeError(f"Can not restore action {action_id}, the registry holds other actions")
+
+    def get(self, action_id: int) -> WindowAction:
+        return self._actions[action_id]
+
+    @property
+    def actions(self) -> List[WindowAction]:
+        """All registered actions, positioned by id."""
+        return self._actions
+
+    def __contains__(self, action: WindowAction) -> bool:
+        return action in self._ids
+
+    def __iter__(self) -> Iterator[WindowAction]:
+        return iter(self._actions)
+
+    def __len__(self) -> int:
+        return len(self._actions)
+
+
+action_registry = ActionRegistry()
@@ -1,39 +1,44 @@
-from collections import defaultdict
 from typing import List
 
+from action.action_registry import action_registry
 from action.element_locator import ElementLocator
 from action.impl.back_action import BackAction
 from action.impl.click_action import ClickAction
 from action.window_action import WindowAction
 from action.window_action_detector import WindowActionDetector
 from hmdriver2.driver import Driver
-from hmdriver2.utils import parse_bounds
+from utils import LRUCache
 
 
 class ClickActionDetector(WindowActionDetector):
+    MEMO_SIZE = 256
+
     def __init__(self, driver: Driver):
         self.d = driver
-        pass
+        # Layout digest -> detected actions, revisited screens reuse the same action objects.
+        self.memo = LRUCache(self.MEMO_SIZE)
 
     def get_actions(self, driver: Driver) -> List[WindowAction]:
+        observation = self.d.observation
+        if observation.actions is not None:
+            return observation.actions
+        cached = self.memo.get(observation.digest)
+        if cached is not None:
+            observation.actions = cached
+            return cached
         window_action_list: list[WindowAction] = []
-        root = self.d.dump_hierarchy()
-        ability_name, page_path = self.d.get_ability_and_page()
-
-        def dfs(node: dict, xpath: str):
-            if node["attributes"]["clickable"] == "true":
-                bounds = parse_bounds(node["attributes"]["bounds"])
-                center = bounds.get_center()
-                window_action_list.append(
-                    ClickAction(ElementLocator.XPATH, xpath, center.x, center.y, ability_name, page_path))
-            type_dict: dict[str, int] = defaultdict(lambda: 0)
-            for child in node["children"]:
-                child_type = child["attributes"]["type"]
-                if child_type == "WindowScene":
-                    return
-                type_dict[child_type] += 1
-                dfs(child, xpath + "/" + child_type + f"[{type_dict[child_type]}]")
+        tree = observation.tree
+        ability_name, page_path = observation.ability_name, observation.page_path
 
-        dfs(root, "/")
-        window_action_list.append(BackAction(ability_name, page_path))
+        indexes = tree.detectable_clickable()
+        for index, (x, y) in zip(indexes, tree.centers(indexes)):
+            # A revisited element resolves to the instance registered on its first detection, which is moved to
+            # the coordinates and fingerprint of this observation.
+            action = action_registry.intern(
+                ClickAction(ElementLocator.XPATH, tree.xpath(index), int(x), int(y), ability_name, page_path))
+            action.x, action.y, action.fingerprint = int(x), int(y), observation.fingerprint
+            window_action_list.append(action)
+        window_action_list.append(action_registry.intern(BackAction(ability_name, page_path)))
+        observation.actions = window_action_list
+        self.memo.put(observation.digest, window_action_list)
         return window_action_list
@@ -1,15 +1,14 @@
-import time
-
 from action.element_locator import ElementLocator
 from action.window_action import WindowAction
 from agent.impl.chatgpt_agent import ChatgptAgent
 from hmdriver2.driver import Driver
 from hmdriver2.proto import KeyCode
+from hmdriver2.xpath import XMLElement
 
 
 class ClickAction(WindowAction):
     def __init__(self, locator: ElementLocator, location: str, x: int | float, y: int | float, ability_name: str,
-                 page_path: str) -> None:
+                 page_path: str, fingerprint: int | None = None) -> None:
         super().__init__()
         self.locator = locator
         self.location = location
@@ -17,19 +16,31 @@ class ClickAction(WindowAction):
         self.y = y
         self.ability_name = ability_name
         self.page_path = page_path
+        # Layout fingerprint of the observation the action was detected on, see Observation.fingerprint.
+        self.fingerprint = fingerprint
 
 
     def execute(self, d: Driver) -> None:
-        a, p = d.get_ability_and_page()
+        observation = d.observation
+        a, p = observation.ability_name, observation.page_path
         # keyboard_exist = d(id="KeyCanvasKeyboard").exists(retries=1)
         keyboard_exist = d.keyboard_exist(retries=1)
         xml_element = None
-        if self.locator is not None and self.location is not None:
+        if self.fingerprint is not None and self.fingerprint == observation.fingerprint and self.x is not None:
+            # The screen is still the one the action was detected on, tap the detected coordinates.
+            d.click(self.x, self.y)
+            if self.location is not None:
+                index = observation.tree.find_by_xpath(self.location)
+                if index is not None:
+                    xml_element = XMLElement(None, observation.tree.type_of(index),
+                                             observation.tree.attributes_of(index), d)
+        elif self.locator is not None and self.location is not None:
             xml_element = self.locator.locate(d, self.location)
             # xml_element.click()
             xml_element.click_if_exists()
         else:
             d.click(self.x, self.y)
+        d.wait_settled(self.page_path)
         # TODO: optimize code
         # if xml_element.ele_type == "TextInput":
         #     input_length = random.randint(1, 10)
@@ -42,17 +53,13 @@ class ClickAction(WindowAction):
         # if (not keyboard_exist or a != ability_name or p != page_name) and d(id="KeyCanvasKeyboard").exists(retries=1):
         if (not keyboard_exist or a != ability_name or p != page_name) and d.keyboard_exist(retries=1):
             pre_text_len = 5
-            if xml_element:
-                pre_text_len = len(xml_element.attributes.get("text"))
-            for _ in range(pre_text_len):
-                d.shell(f"uitest uiInput keyEvent {KeyCode.DEL.value}")
+            if xml_element and xml_element.attributes:
+                pre_text_len = len(xml_element.attributes.get("text", ""))
             chatgpt_agent = ChatgptAgent(d)
             input_text = chatgpt_agent.generate_text_input()
             print("Generate TextInput: ", input_text)
-            # d.input_text(input_text)
-            d.shell(f"uitest uiInput inputText 1 1 {input_text}")
-            d.press_key(KeyCode.ENTER)
-            time.sleep(2)
+            d.enter_text(input_text, clear_length=pre_text_len)
+            d.wait_settled(self.page_path)
 
 
     def __eq__(self, other: object) -> bool:
@@ -11,8 +11,7 @@ class RestartAction(WindowAction):
         self.ability_name = ability_name
 
     def execute(self, driver: Driver) -> None:
-        driver.force_stop_app()
-        driver.start_app(self.app, self.ability_name)
+        driver.restart_app(self.app, self.ability_name)
         # time.sleep(3)
 
     def __eq__(self, other: object) -> bool:
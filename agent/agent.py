@@ -1,5 +1,8 @@
 from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any
 
+from action.action_registry import action_registry
 from action.window_action import WindowAction
 from hmdriver2.driver import Driver
 from state.window_state import WindowState
@@ -12,10 +15,15 @@ class Agent(ABC):
     #     self.action_count: dict[int, int] = {}
 
     def __init__(self, d: Driver, app: str, ability_name: str, PTG: dict, use_ptg: bool, config):
-        self.action_list: list[WindowAction] = []
-        self.action_count: dict[int, int] = {}
+        # Actions are numbered by the shared registry, action_list[i] is the action with id i.
+        self.registry = action_registry
+        self.action_count: dict[int, int] = defaultdict(int)
         self.config = config
 
+    @property
+    def action_list(self) -> list[WindowAction]:
+        return self.registry.actions
+
     @abstractmethod
     def get_action(self, window_state: WindowState) -> WindowAction:
         pass
@@ -24,18 +32,13 @@ class Agent(ABC):
     def update_state(self, chosen_action: WindowAction, window_state: WindowState) -> None:
         pass
 
+    def export_tables(self) -> dict[str, Any]:
+        """A snapshot of what the agent has learned, restored with `import_tables`."""
+        return {"action_count": dict(self.action_count)}
+
+    def import_tables(self, tables: dict[str, Any]) -> None:
+        self.action_count.update(tables.get("action_count", {}))
+
     def state_abstraction(self, state: WindowState):
-        actions = state.get_action_list()
-        for a in actions:
-            if a not in self.action_list:
-                self.action_list.append(a)
-                self.action_count[self.action_list.index(a)] = 0
-
-        action_index_set = set()
-        for a in actions:
-            action_index_set.add(self.action_list.index(a))
-        action_index_list = list(action_index_set)
-        action_index_list.sort()
-        action_index_list_str = [str(x) for x in action_index_list]
-        state_representation = ','.join(action_index_list_str)
-        return state_representation
+        action_index_list = sorted(set(self.registry.ids_of(state.get_action_list())))
+        return ','.join(str(x) for x in action_index_list)
@@ -7,6 +7,7 @@ from action.impl.click_action import ClickAction
 from action.window_action import WindowAction
 from agent.agent import Agent
 from agent.impl.q_learning_agent import QLearningAgent
+from config.event_log import event_log
 from hmdriver2.driver import Driver
 from state.impl.action_set_state import ActionSetState
 from state.window_state import WindowState
@@ -46,6 +47,29 @@ class DFSAgent(Agent):
             self.page_path_count["pages/LoginPage"] = 1
         self.start_page = None
 
+    def export_tables(self) -> dict:
+        tables = super().export_tables()
+        tables.update({
+            "q_learning": self.q_learning_agent.export_tables(),
+            "page_path_count": dict(self.page_path_count),
+            "intra_q_try_count": dict(self.intra_q_try_count),
+            "total_action_number": self.total_action_number,
+            "start_page": self.start_page,
+        })
+        return tables
+
+    def import_tables(self, tables: dict) -> None:
+        super().import_tables(tables)
+        if "q_learning" not in tables:
+            return
+        self.q_learning_agent.import_tables(tables["q_learning"])
+        self.page_path_count.update(tables["page_path_count"])
+        self.intra_q_try_count.update(tables["intra_q_try_count"])
+        self.total_action_number = tables["total_action_number"]
+        self.start_page = tables["start_page"]
+        if self.start_page is not None:
+            self.calculate_router_pages()
+
     def calculate_in_degree(self):
         for source_page, actions in self.PTG.items():
             for action in actions:
@@ -82,7 +106,8 @@ class DFSAgent(Agent):
             return actions[0]
         # 如果遍历完全部页面了或者超过一些时间，q-learning执行：
         # if self.total_action_number >= 45 or len(self.page_path_count) == len(self.PTG):
-        print(f"{self.total_action_number}, {len(self.page_path_count)}, {len(self.router_pages)}")
+        event_log.debug("dfs progress", actions=self.total_action_number, pages=len(self.page_path_count),
+                        router_pages=len(self.router_pages))
         if self.total_action_number >= 45 or len(self.page_path_count) >= len(self.router_pages):
             # if self.in_degree[page_path] == 0:
             #     temp_actions = [action for action in actions if not isinstance(action, BackAction)]
@@ -92,11 +117,8 @@ class DFSAgent(Agent):
             #         chosen_action = BackAction(ability_name, page_path)
             # else:
             #     chosen_action = BackAction(ability_name, page_path)
-            with open("output/log.txt", "a") as f:
-                f.write(
-                    f"{self.total_action_number}, {len(self.page_path_count)}, {len(self.router_pages)}, q-learning finished!\n")
-            print(
-                f"{self.total_action_number}, {len(self.page_path_count)}, {len(self.router_pages)}, q-learning finished!")
+            event_log.info("dfs finished, q-learning", actions=self.total_action_number,
+                           pages=len(self.page_path_count), router_pages=len(self.router_pages))
             state_index = self.q_learning_agent.get_state_index(window_state)
             self.q_learning_agent.state_count[state_index] += 1
             return self.q_learning_agent.get_action(window_state)
@@ -114,9 +136,7 @@ class DFSAgent(Agent):
             #     self.q_learning_agent.state_count[state_index] += 1
             #     return chosen_action
             # self.PTG_exploration[page_path] = True
-            print("back")
-            with open("output/log.txt", "a") as f:
-                f.write("back\n")
+            event_log.info("back")
             state_index = self.q_learning_agent.get_state_index(window_state)
             self.q_learning_agent.state_count[state_index] += 1
             # self.PTG_exploration[page_path] = True
@@ -137,15 +157,13 @@ class DFSAgent(Agent):
                           action not in self.state_used_action_dict[window_state]]
         # 如果有真正在当前页面上的控件，执行
         # useful_actions = [action for action in possible_useful_actions if action not in useful_actions]
-        print("useful actions:", useful_actions)
+        event_log.debug("useful actions", actions=[str(action) for action in useful_actions])
         if useful_actions:
-            print("target")
             chosen_action = random.choice(useful_actions)
             self.state_used_action_dict[window_state].add(chosen_action)
             state_index = self.q_learning_agent.get_state_index(window_state)
             self.q_learning_agent.state_count[state_index] += 1
-            with open("output/log.txt", "a") as f:
-                f.write("target click\n")
+            event_log.info("target click")
             return chosen_action
 
         if self.intra_q_try_count[page_path] < 15:
@@ -161,9 +179,7 @@ class DFSAgent(Agent):
             self.q_learning_agent.state_count[state_index] += 1
             # with open("output/log.txt", "a") as f:
             #     f.write("q-learning finishing......\n")
-            print(f"Page {page_path} no direct DFS jump. Try Q-learning within page.")
-            with open("output/log.txt", "a") as f:
-                f.write(f"Try Q-learning in {page_path}\n")
+            event_log.info("try q-learning", page=page_path)
             chosen_action = self.q_learning_agent.get_action(window_state)
             while isinstance(chosen_action, BackAction):
                 chosen_action = self.q_learning_agent.get_action(window_state)
@@ -174,9 +190,7 @@ class DFSAgent(Agent):
                 self.page_path_count[target_page] = self.page_path_count.get(target_page, 0) + 1
                 state_index = self.q_learning_agent.get_state_index(window_state)
                 self.q_learning_agent.state_count[state_index] += 1
-        print(f"Page {page_path}: Q-learning tries used up -> BackAction")
-        with open("output/log.txt", "a") as f:
-            f.write(f"Page {page_path}: Q-learning tries used up -> BacAction\n")
+        event_log.info("q-learning tries used up, back", page=page_path)
         return BackAction(ability_name, page_path)
 
         # [CHANGED] 如果本页面没有能跳到新页面的控件
@@ -1,15 +1,20 @@
+import json
 import logging
 
 import math
 import random
 from collections import defaultdict
 
+import numpy as np
+
 from action.impl.back_action import BackAction
 from action.impl.click_action import ClickAction
 from action.impl.restart_action import RestartAction
 from action.window_action import WindowAction
 from agent.agent import Agent
+from agent.q_table import QTable
 from config import LogConfig
+from config.event_log import event_log
 from exceptions import NoActionsException
 from hmdriver2.driver import Driver
 from state.impl.action_set_state import ActionSetState
@@ -38,7 +43,9 @@ class QLearningAgent(Agent):
         self.EPSILON = config["agent"].get("epsilon", 0.1)
         self.INITIAL_Q_VALUE = config["agent"].get("initial-q-value", 10.0)
         self.state_repr_list = list()
-        self.q_table: dict[int, dict[int, float]] = dict()
+        self.state_index: dict[str, int] = dict()
+        self.restart_index: int | None = None
+        self.q_table = QTable(fill=self.INITIAL_Q_VALUE)
         self.page_path_count = defaultdict(int)
         self.state_count = defaultdict(int)
         self.trans_count = defaultdict(int)
@@ -49,6 +56,8 @@ class QLearningAgent(Agent):
         self.calculate_in_degree()
         self.transition_count: dict[tuple[int, int, int], int] = defaultdict(int)
         self.total_action_count = 0
+        # KnowledgeBase of earlier runs, set by AppTest when warm starts are enabled.
+        self.knowledge = None
 
     def calculate_in_degree(self):
         for source_page, actions in self.PTG.items():
@@ -63,21 +72,18 @@ class QLearningAgent(Agent):
             self.state_repr_list.append(OutOfDomainState(self.app, self.ability_name))
             # self.state_repr_list.append(ActionExecuteFailedState("111"))
             self.state_repr_list.append(SameUrlState(self.app, self.ability_name))
-            self.q_table[0] = dict()
-            self.q_table[1] = dict()
-            # self.q_table[2] = dict()
-            self.q_table[0][0] = -9999
-            self.q_table[1][0] = -99
-            self.q_table[0][1] = -9999
-            self.q_table[1][1] = -99
-            # self.q_table[2][0] = -99
 
         ability_name, page_path = self.d.get_ability_and_page()
-        if len(self.action_list) == 0:
-            self.action_list.append(RestartAction(self.app, self.ability_name))
-            self.action_list.append(BackAction(ability_name, page_path))
-            self.action_count[0] = 0
-            self.action_count[1] = 0
+        if self.restart_index is None:
+            self.restart_index = self.registry.id_of(RestartAction(self.app, self.ability_name))
+            back_index = self.registry.id_of(BackAction(ability_name, page_path))
+            self.q_table.set(0, self.restart_index, -9999)
+            self.q_table.set(1, self.restart_index, -99)
+            self.q_table.set(0, back_index, -9999)
+            self.q_table.set(1, back_index, -99)
+            # self.q_table.set(2, self.restart_index, -99)
+            self.action_count[self.restart_index] = 0
+            self.action_count[back_index] = 0
         if isinstance(state, OutOfDomainState):
             return 0
         # if isinstance(state, ActionExecuteFailedState):
@@ -86,15 +92,14 @@ class QLearningAgent(Agent):
             return 1
 
         state_instance = self.state_abstraction(state)
-        if state_instance not in self.state_repr_list:
-            s_idx = len(self.state_repr_list)
+        s_idx = self.state_index.get(state_instance)
+        if s_idx is None:
+            s_idx = self.state_index[state_instance] = len(self.state_repr_list)
             self.state_repr_list.append(state_instance)
             action_value = dict()
             actions = state.get_action_list()
             for action in actions:
-                if action not in self.action_list:
-                    self.action_list.append(action)
-                a_idx = self.action_list.index(action)
+                a_idx = self.registry.id_of(action)
                 # if  action.locator.value == 'xpath':
                 # action_value[a_idx] = self.INITIAL_Q_VALUE
                 exist = False
@@ -107,8 +112,7 @@ class QLearningAgent(Agent):
                             break
                     # 如果存在PTG的边，初始值设置高的分数
                     if exist:
-                        print("exist")
-                        print(f"{state.page_path}, {c} -> {t}")
+                        event_log.debug("ptg edge", page=state.page_path, component=c, target=t)
                         # 跳转
                         if t:
                             action_value[a_idx] = 10.4
@@ -127,9 +131,10 @@ class QLearningAgent(Agent):
                 #     if isinstance(action, ClickAction) and "TabBar" in action.location:
                 #         print("TabBar exist")
                 #         action_value[a_idx] = 10.5
-            self.q_table[s_idx] = action_value
-        else:
-            s_idx = self.state_repr_list.index(state_instance)
+            if self.knowledge is not None:
+                for position, value in self.knowledge.q_values(actions).items():
+                    action_value[self.registry.id_of(actions[position])] = value
+            self.q_table.set_row(s_idx, action_value)
         return s_idx
 
     def get_reward(self, prev_state_index, action_index, state_index):
@@ -143,7 +148,6 @@ class QLearningAgent(Agent):
         # if isinstance(window_state, OutOfDomainState) or isinstance(window_state, SameUrlState):
         #     return 0
         action_count = self.action_count[self.previous_action]
-        print(f"transition: {prev_state_index}, {action_index}, {state_index}")
         self.transition_count[(prev_state_index, action_index, state_index)] += 1
         # if action_count == 1:
         #     reward = 1.0
@@ -151,10 +155,8 @@ class QLearningAgent(Agent):
         #     reward = 1.0 / action_count
         # reward = 1.0 / math.sqrt(action_count)
         reward = 1.0 / self.transition_count[(prev_state_index, action_index, state_index)]
-        print(f"reward: {reward}")
-        with open("output/log.txt", "a") as f:
-            f.write(f"transition: {prev_state_index}, {action_index}, {state_index}\n")
-            f.write(f"reward: {reward}\n")
+        event_log.info("transition", prev_state=prev_state_index, action=action_index, state=state_index,
+                       reward=reward)
         # reward = 1.0 / math.sqrt(self.state_count[state_index] + 1)
         # 负奖励，与访问次数相关
         # penalty = 0.1 * self.state_count[state_index]
@@ -201,10 +203,8 @@ class QLearningAgent(Agent):
     #     self.q_table[self.previous_state][self.previous_action] = q_predict + self.ALPHA * (q_target - q_predict)
 
     def update(self, state_index, action_index):
-        ps_q_values = self.q_table[self.previous_state]
-        cs_q_values = self.q_table[state_index]
         reward = self.get_reward(self.previous_state, action_index, state_index)
-        q_predict = ps_q_values[action_index]
+        q_predict = self.q_table.get(self.previous_state, action_index)
         if self.AGENT_TYPE == "Q":
             action_len = 1
             # if isinstance(window_state, ActionExecuteFailedState):
@@ -214,22 +214,55 @@ class QLearningAgent(Agent):
             gamma = self.GAMMA
         else:
             gamma = self.GAMMA
-        q_target = reward + gamma * max(cs_q_values.values())
-        print(f"Updated Q[{self.previous_state}][{action_index}] Value:",
-              self.q_table[self.previous_state][action_index], "->",
-              q_predict + self.ALPHA * (q_target - q_predict))
-        msg = f"Updated Q[{self.previous_state}][{action_index}] Value:" + str(
-            self.q_table[self.previous_state][action_index]) + "->" + str(
-            q_predict + self.ALPHA * (q_target - q_predict))
-        with open("output/log.txt", "a") as f:
-            f.write(msg + "\n")
-        logger.info(msg)
-        self.q_table[self.previous_state][action_index] = q_predict + self.ALPHA * (q_target - q_predict)
+        q_target = reward + gamma * self.q_table.max(state_index)
+        q_value = q_predict + self.ALPHA * (q_target - q_predict)
+        event_log.info("q update", state=self.previous_state, action=action_index, old=q_predict, new=q_value)
+        self.q_table.set(self.previous_state, action_index, q_value)
+
+    def export_tables(self) -> dict:
+        tables = super().export_tables()
+        tables.update({
+            "q_table": self.q_table.copy(),
+            "state_repr_list": list(self.state_repr_list),
+            "restart_index": self.restart_index,
+            "state_count": dict(self.state_count),
+            "transition_count": dict(self.transition_count),
+            "total_action_count": self.total_action_count,
+        })
+        return tables
+
+    def learned_rows(self):
+        """(actions, Q-value per action, visits) of every observed state, for the knowledge base."""
+        for s_idx in self.q_table.states():
+            if s_idx < 2:
+                continue
+            state_instance = self.state_repr_list[s_idx]
+            actions = [self.registry.get(int(a_idx)) for a_idx in state_instance.split(",")] if state_instance else []
+            values = {self.registry.get(a_idx): value for a_idx, value in self.q_table.row(s_idx).items()}
+            yield actions, values, self.state_count[s_idx]
+
+    def import_tables(self, tables: dict) -> None:
+        super().import_tables(tables)
+        if "q_table" not in tables:
+            return
+        self.q_table = tables["q_table"]
+        self.state_repr_list = list(tables["state_repr_list"])
+        self.state_index = {state_repr: index for index, state_repr in enumerate(self.state_repr_list)
+                            if isinstance(state_repr, str)}
+        self.restart_index = tables["restart_index"]
+        self.state_count.update(tables["state_count"])
+        self.transition_count.update(tables["transition_count"])
+        self.total_action_count = tables["total_action_count"]
+
+    def dump_q_table(self, path: str) -> None:
+        """Write the Q-table as JSON, `{state index: {action id: value}}`."""
+        with open(path, "w") as f:
+            json.dump({state: self.q_table.row(state) for state in self.q_table.states()}, f)
 
     def get_action_index(self, action):
-        if isinstance(action, RestartAction):
-            return 0
-        return self.action_list.index(action)
+        if isinstance(action, RestartAction) and self.restart_index is not None:
+            return self.restart_index
+        return self.registry.id_of(action)
 
     def get_action(self, window_state: WindowState):
         actions = window_state.get_action_list()
@@ -241,14 +274,12 @@ class QLearningAgent(Agent):
             # raise NoActionsException("The state does not have any actions")
 
         stop_update = False
+        policy = "fixed"
 
         state_index = self.get_state_index(window_state)
         self.state_count[state_index] += 1
         # x = random.uniform(0, 1)
         x = random.random()
-        with open("output/log.txt", "a") as f:
-            f.write(str(x) + "\n")
-        print(x)
         # if chosen_action or 0 <= x < self.EPSILON:
         #     print("q-learning")
         #     with open("output/log.txt", "a") as f:
@@ -282,38 +313,22 @@ class QLearningAgent(Agent):
         #     chosen_action = BackAction()
         #     max_val = self.q_table[state_index][self.get_action_index(chosen_action)]
         if chosen_action:
-            max_val = self.q_table[state_index][self.get_action_index(chosen_action)]
+            max_val = self.q_table.get(state_index, self.get_action_index(chosen_action))
         elif len(actions) == 1 and isinstance(actions[0], RestartAction):
             chosen_action = actions[0]
-            max_val = self.q_table[state_index][self.get_action_index(chosen_action)]
+            max_val = self.q_table.get(state_index, self.get_action_index(chosen_action))
         else:
             if x >= self.EPSILON:
-                with open("output/log.txt", "a") as f:
-                    f.write("q-learning" + "\n")
-                print("q-learning")
-                chosen_action = actions[0]
-                max_val = self.q_table[state_index][self.get_action_index(chosen_action)]
-                max_actions = [chosen_action]
-                for i in range(1, len(actions)):
-                    temp_action = actions[i]
-                    # if isinstance(temp_action, RestartAction):
-                    #     chosen_action = temp_action
-                    #     max_actions = [temp_action]
-                    #     break
-                    if self.q_table[state_index][self.get_action_index(temp_action)] > max_val:
-                        max_val = self.q_table[state_index][self.get_action_index(temp_action)]
-                        chosen_action = temp_action
-                        max_actions = [temp_action]
-                    elif self.q_table[state_index][self.get_action_index(temp_action)] == max_val:
-                        max_actions.append(temp_action)
-                chosen_action = random.choice(max_actions)
-                print(chosen_action)
+                policy = "q-learning"
+                action_indexes = np.fromiter((self.get_action_index(action) for action in actions), dtype=np.int64,
+                                             count=len(actions))
+                max_positions = self.q_table.best(state_index, action_indexes)
+                max_val = self.q_table.get(state_index, int(action_indexes[max_positions[0]]))
+                chosen_action = actions[random.choice(max_positions.tolist())]
             # elif 0.5 <= x < (1 if self.use_ptg and self.in_degree[page_path] == 0 else 1):
             else:
-                with open("output/log.txt", "a") as f:
-                    f.write("random" + "\n")
-                print("random")
-                max_val = max(self.q_table[state_index].values())
+                policy = "random"
+                max_val = self.q_table.max(state_index)
                 # chosen_action = random.choice(actions)
                 if self.use_ptg and self.in_degree[page_path] == 0:
                     temp_actions = [action for action in actions if not isinstance(action, BackAction)]
@@ -362,12 +377,10 @@ class QLearningAgent(Agent):
         # print("previous_state: ", self.previous_state, "current_state: ", state_index)
         # self.previous_state = state_index
         # self.previous_action = self.get_action_index(chosen_action)
-        print("max_q_value: ", max_val, "  chosen_action: ", chosen_action)
-        with open("output/log.txt", "a") as f:
-            f.write(f"max_q_value: {max_val}  chosen_action: {chosen_action}\n")
-        print(self.state_count)
-        print(self.action_count)
-        print(self.q_table)
+        event_log.info("choose", x=x, policy=policy, max_q_value=max_val, chosen_action=str(chosen_action))
+        if event_log.enabled(logging.DEBUG):
+            event_log.debug("q values", state=state_index, state_count=self.state_count[state_index],
+                            row=self.q_table.row(state_index))
         self.total_action_count += 1
         # decay_rate = (0.5 - 0.2) / 80
         # self.EPSILON = max(self.EPSILON - decay_rate * self.total_action_count, 0.2)
@@ -378,6 +391,6 @@ class QLearningAgent(Agent):
         action_index = self.get_action_index(chosen_action)
         if self.previous_state is not None and self.previous_action is not None:
             self.update(state_index, action_index)
-        print("previous_state: ", self.previous_state, "current_state: ", state_index)
+        event_log.debug("state", previous_state=self.previous_state, current_state=state_index)
         self.previous_state = state_index
         self.previous_action = action_index
@@ -0,0 +1,310 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+from action.action_registry import action_registry
+from action.element_locator import ElementLocator
+from action.impl.back_action import BackAction
+from action.impl.click_action import ClickAction
+from action.window_action import WindowAction
+from checkpoint import write_atomic
+from config import LogConfig
+from state.impl.action_set_state import ActionSetState
+from state.window_state import WindowState
+
+logger = logging.getLogger(__name__)
+logger.addHandler(LogConfig.get_file_handler())
+
+Q_DTYPE = np.dtype([("state", "<u8"), ("action", "<u8"), ("value", "<f4"), ("visits", "<u4"), ("age", "<u2")])
+DFA_DTYPE = np.dtype([("source", "<i4"), ("action", "<i4"), ("target", "<i4"), ("age", "<u2")])
+
+
+def action_key(action: WindowAction) -> Union[Dict[str, Any], None]:
+    """What identifies an action across runs, None for actions that are not carried over."""
+    if isinstance(action, ClickAction):
+        return {"type": "click", "locator": action.locator.name if action.locator is not None else None,
+                "location": action.location,
+                "ability_name": action.ability_name, "page_path": action.page_path}
+    if isinstance(action, BackAction):
+        return {"type": "back", "ability_name": action.ability_name, "page_path": action.page_name}
+    return None
+
+
+def _fingerprint(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def key_fingerprint(key: Dict[str, Any]) -> int:
+    return _fingerprint(json.dumps(key, sort_keys=True).encode("utf-8"))
+
+
+class KnowledgeBase:
+    """
+    What earlier runs of one app learned: Q-values and visit counts per (state, action), and the DFA.
+
+    States and actions are keyed by fingerprints that do not depend on registry ids or coordinates: an action by
+    its locator, location, ability and page, a state by the set of its action fingerprints. The files of a bundle
+    live in `<root>/<bundle>/`; the numeric ones are `.npy` arrays opened memory-mapped, the Q entries sorted by
+    (state, action) so that a state's row is one binary search.
+
+    Every save writes its arrays to a new generation directory, then replaces `meta.json`, which names that
+    generation and the array lengths, in one atomic step; a crash in between leaves the previous generation in
+    use. A base whose arrays do not match its `meta.json` is ignored.
+
+    A value learned `age` runs ago is decayed towards the initial Q-value by `decay ** age`; entries not refreshed
+    for `max_age` runs are dropped on save. Files written by another `VERSION` are ignored.
+    """
+
+    VERSION = 2
+    ARRAYS = ("q", "dfa", "state_offsets", "state_actions")
+
+    def __init__(self, root: str, bundle: str, initial_q_value: float = 10.0, decay: float = 0.8,
+                 max_age: int = 10):
+        self.path = os.path.join(root, bundle)
+        self.initial_q_value = initial_q_value
+        self.decay = decay
+        self.max_age = max_age
+        self.runs = 0
+        self.actions: List[Dict[str, Any]] = []
+        self.states: List[Tuple[str, str]] = []
+        self.state_offsets = np.zeros(1, dtype=np.int64)
+        self.state_actions = np.zeros(0, dtype=np.int32)
+        self.q = np.zeros(0, dtype=Q_DTYPE)
+        self.dfa = np.zeros(0, dtype=DFA_DTYPE)
+        # Fingerprints of registry actions, by registry id.
+        self._action_fingerprints: List[Union[int, None]] = []
+        self.load()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def load(self) -> None:
+        try:
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get("version") != self.VERSION:
+            logger.info(f"Ignoring knowledge base {self.path} of version {meta.get('version')}")
+            return
+        try:
+            directory = self._file(meta["generation"])
+            arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in self.ARRAYS}
+            actions, states = meta["actions"], [tuple(state) for state in meta["states"]]
+            consistent = self._consistent(arrays, meta["lengths"], len(actions), len(states))
+        except (KeyError, TypeError, OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable knowledge base {self.path}: {e}")
+            return
+        if not consistent:
+            logger.warning(f"Ignoring knowledge base {self.path}, its arrays do not match meta.json")
+            return
+        self.runs = meta.get("runs", 0)
+        self.actions, self.states = actions, states
+        self.q, self.dfa = arrays["q"], arrays["dfa"]
+        self.state_offsets, self.state_actions = arrays["state_offsets"], arrays["state_actions"]
+        logger.info(f"Loaded knowledge base {self.path}: {len(self.q)} Q-values, {len(self.dfa)} DFA edges "
+                    f"from {self.runs} runs")
+
+    @staticmethod
+    def _consistent(arrays: Dict[str, np.ndarray], lengths: Dict[str, int], actions: int, states: int) -> bool:
+        """Whether the arrays are those `meta.json` describes and only refer to its actions and states."""
+        if any(len(arrays[name]) != lengths[name] for name in arrays):
+            return False
+        offsets, state_actions, dfa = arrays["state_offsets"], arrays["state_actions"], arrays["dfa"]
+        if len(offsets) != states + 1 or offsets[0] != 0 or offsets[-1] != len(state_actions):
+            return False
+        if np.any(np.diff(offsets) < 0):
+            return False
+        if len(state_actions) and not 0 <= state_actions.min() <= state_actions.max() < actions:
+            return False
+        if len(dfa):
+            for field, limit in (("source", states), ("target", states), ("action", actions)):
+                if not 0 <= dfa[field].min() <= dfa[field].max() < limit:
+                    return False
+        return True
+
+    def action_fingerprint(self, action: WindowAction) -> Union[int, None]:
+        action_id = action_registry.id_of(action)
+        cache = self._action_fingerprints
+        while len(cache) <= action_id:
+            key = action_key(action_registry.get(len(cache)))
+            cache.append(key_fingerprint(key) if key is not None else None)
+        return cache[action_id]
+
+    def state_fingerprint(self, actions: Iterable[WindowAction]) -> int:
+        fingerprints = sorted({fingerprint for fingerprint in map(self.action_fingerprint, actions)
+                               if fingerprint is not None})
+        return _fingerprint(np.array(fingerprints, dtype=np.uint64).tobytes())
+
+    def decayed(self, value: float, age: int) -> float:
+        return self.initial_q_value + (value - self.initial_q_value) * self.decay ** age
+
+    def q_values(self, actions: List[WindowAction]) -> Dict[int, float]:
+        """Decayed values learned for the state made of `actions`, by position in `actions`."""
+        if not len(self.q):
+            return {}
+        state = np.uint64(self.state_fingerprint(actions))
+        states = self.q["state"]
+        start, stop = np.searchsorted(states, state, side="left"), np.searchsorted(states, state, side="right")
+        if start == stop:
+            return {}
+        row = self.q[start:stop]
+        learned = {int(action): self.decayed(float(value), int(age))
+                   for action, value, age in zip(row["action"], row["value"], row["age"])}
+        values = {}
+        for position, action in enumerate(actions):
+            value = learned.get(self.action_fingerprint(action))
+            if value is not None:
+                values[position] = value
+        return values
+
+    def _action(self, index: int) -> WindowAction:
+        key = self.actions[index]
+        if key["type"] == "click":
+            action = ClickAction(ElementLocator[key["locator"]] if key["locator"] else None, key["location"], None, None, key["ability_name"],
+                                 key["page_path"])
+        else:
+            action = BackAction(key["ability_name"], key["page_path"])
+        return action_registry.intern(action)
+
+    def _state(self, index: int) -> ActionSetState:
+        ability_name, page_path = self.states[index]
+        actions = [self._action(int(a)) for a in self.state_actions[self.state_offsets[index]:self.state_offsets[index + 1]]]
+        return ActionSetState(actions, ability_name, page_path)
+
+    def dfa_edges(self) -> List[Tuple[ActionSetState, WindowAction, ActionSetState]]:
+        """The learned DFA transitions as (state, action, next state), rebuilt as live objects."""
+        states: Dict[int, ActionSetState] = {}
+        edges = []
+        for source, action, target in zip(self.dfa["source"].tolist(), self.dfa["action"].tolist(),
+                                          self.dfa["target"].tolist()):
+            for index in (source, target):
+                if index not in states:
+                    states[index] = self._state(index)
+            edges.append((states[source], self._action(action), states[target]))
+        return edges
+
+    def save(self, q_rows: Iterable[Tuple[List[WindowAction], Dict[WindowAction, float], int]],
+             dfa: Dict[WindowState, Dict[WindowAction, WindowState]]) -> None:
+        """
+        Merge this run into the knowledge base and write it.
+
+        Args:
+            q_rows: For each learned state, its actions, the Q-values of those actions and its visit count.
+            dfa: The DFA of this run.
+        """
+        action_index: Dict[int, int] = {}
+        actions: List[Dict[str, Any]] = []
+        state_index: Dict[int, int] = {}
+        states: List[Tuple[str, str]] = []
+        state_action_lists: List[List[int]] = []
+
+        def add_action(key: Dict[str, Any]) -> int:
+            fingerprint = key_fingerprint(key)
+            index = action_index.get(fingerprint)
+            if index is None:
+                index = action_index[fingerprint] = len(actions)
+                actions.append(key)
+            return index
+
+        def add_state(fingerprint: int, ability_name: str, page_path: str, keys: List[Dict[str, Any]]) -> int:
+            index = state_index.get(fingerprint)
+            if index is None:
+                index = state_index[fingerprint] = len(states)
+                states.append((ability_name, page_path))
+                state_action_lists.append([add_action(key) for key in keys])
+            return index
+
+        # Entries of earlier runs age by one run, this run's entries replace them with age 0.
+        q_entries: Dict[Tuple[int, int], Tuple[float, int, int]] = {}
+        for entry in np.asarray(self.q):
+            if int(entry["age"]) + 1 <= self.max_age:
+                q_entries[(int(entry["state"]), int(entry["action"]))] = (
+                    float(entry["value"]), int(entry["visits"]), int(entry["age"]) + 1)
+        for state_actions, values, visits in q_rows:
+            state = self.state_fingerprint(state_actions)
+            for action, value in values.items():
+                fingerprint = self.action_fingerprint(action)
+                if fingerprint is not None:
+                    previous = q_entries.get((state, fingerprint))
+                    total_visits = visits + (previous[1] if previous else 0)
+                    q_entries[(state, fingerprint)] = (value, total_visits, 0)
+
+        dfa_entries: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        for source, action, target, age in zip(self.dfa["source"].tolist(), self.dfa["action"].tolist(),
+                                               self.dfa["target"].tolist(), self.dfa["age"].tolist()):
+            if age + 1 > self.max_age:
+                continue
+            keys = self._state_keys(source)
+            s = add_state(self._state_fingerprint_of_keys(keys), *self.states[source], keys)
+            keys = self._state_keys(target)
+            t = add_state(self._state_fingerprint_of_keys(keys), *self.states[target], keys)
+            dfa_entries[(s, add_action(self.actions[action]))] = (t, age + 1)
+        for source, edges in dfa.items():
+            if not isinstance(source, ActionSetState):
+                continue
+            for action, target in edges.items():
+                key = action_key(action)
+                if key is None or not isinstance(target, ActionSetState):
+                    continue
+                s = add_state(self.state_fingerprint(source.get_action_list()), source.ability_name,
+                              source.page_path, self._live_keys(source))
+                t = add_state(self.state_fingerprint(target.get_action_list()), target.ability_name,
+                              target.page_path, self._live_keys(target))
+                dfa_entries[(s, add_action(key))] = (t, 0)
+
+        q = np.array([(state, action, value, visits, age)
+                      for (state, action), (value, visits, age) in q_entries.items()], dtype=Q_DTYPE)
+        q.sort(order=["state", "action"])
+        dfa_array = np.array([(s, a, t, age) for (s, a), (t, age) in dfa_entries.items()], dtype=DFA_DTYPE)
+        offsets = np.zeros(len(states) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(state_actions) for state_actions in state_action_lists])
+        state_actions = np.array([a for state_actions in state_action_lists for a in state_actions], dtype=np.int32)
+
+        # The arrays go to a generation nothing refers to yet, meta.json then switches to it in one step.
+        generation = f"run-{self.runs + 1}"
+        arrays = {"q": q, "dfa": dfa_array, "state_offsets": offsets, "state_actions": state_actions}
+        for name, array in arrays.items():
+            buffer = io.BytesIO()
+            np.save(buffer, array)
+            write_atomic(os.path.join(self._file(generation), f"{name}.npy"), buffer.getvalue())
+        write_atomic(self._file("meta.json"), json.dumps({
+            "version": self.VERSION, "runs": self.runs + 1, "updated": time.time(), "generation": generation,
+            "lengths": {name: len(array) for name, array in arrays.items()}, "actions": actions,
+            "states": states}, ensure_ascii=False).encode("utf-8"))
+        # Dropping the maps of the previous generation lets it be removed.
+        self.q, self.dfa, self.state_offsets, self.state_actions = q, dfa_array, offsets, state_actions
+        self.actions, self.states, self.runs = actions, states, self.runs + 1
+        self._remove_old_generations(generation)
+        logger.info(f"Saved knowledge base {self.path}: {len(q)} Q-values, {len(dfa_array)} DFA edges")
+
+    def _remove_old_generations(self, current: str) -> None:
+        for name in os.listdir(self.path):
+            path = self._file(name)
+            if name != current and name.startswith("run-") and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.endswith(".npy"):
+                # Arrays of the single-directory layout of VERSION 1.
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _state_keys(self, index: int) -> List[Dict[str, Any]]:
+        return [self.actions[int(a)] for a in self.state_actions[self.state_offsets[index]:self.state_offsets[index + 1]]]
+
+    @staticmethod
+    def _state_fingerprint_of_keys(keys: List[Dict[str, Any]]) -> int:
+        fingerprints = sorted({key_fingerprint(key) for key in keys})
+        return _fingerprint(np.array(fingerprints, dtype=np.uint64).tobytes())
+
+    @staticmethod
+    def _live_keys(state: ActionSetState) -> List[Dict[str, Any]]:
+        return [key for key in map(action_key, state.get_action_list()) if key is not None]
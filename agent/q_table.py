@@ -0,0 +1,97 @@
+import threading
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+_NO_ACTIONS = np.zeros(0, dtype=np.int64)
+_NO_VALUES = np.zeros(0, dtype=np.float32)
+
+
+class QTable:
+    """
+    Q-values of the (state, action) pairs that have been set, one sparse float32 row per state.
+
+    A row is the sorted array of the action ids set in the state and the array of their values, so memory grows
+    with the pairs set rather than with states × all actions, and the values of a state's candidate actions are
+    gathered with one `searchsorted` and one fancy index, without a Python loop over the candidates. Reading a
+    pair that was never set returns `fill`; row maxima only consider pairs that were set.
+
+    Writes and `copy` hold a lock, and a row that gains an action is replaced as one (actions, values) tuple, so
+    a copy taken by another thread (a checkpoint) is consistent.
+    """
+
+    def __init__(self, fill: float = 0.0):
+        self.fill = fill
+        self.rows: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def copy(self) -> 'QTable':
+        table = QTable(self.fill)
+        with self._lock:
+            table.rows = {state: (actions.copy(), values.copy()) for state, (actions, values) in self.rows.items()}
+        return table
+
+    def _positions(self, state: int, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The row of `state`, the position of each of `actions` in it and whether it is set there."""
+        row_actions, row_values = self.rows.get(state, (_NO_ACTIONS, _NO_VALUES))
+        if not len(row_actions):
+            return row_values, np.zeros(len(actions), dtype=np.int64), np.zeros(len(actions), dtype=bool)
+        positions = np.minimum(np.searchsorted(row_actions, actions), len(row_actions) - 1)
+        return row_values, positions, row_actions[positions] == actions
+
+    def set_row(self, state: int, values: Dict[int, float]) -> None:
+        actions = np.fromiter(values.keys(), dtype=np.int64, count=len(values))
+        new_values = np.fromiter(values.values(), dtype=np.float32, count=len(values))
+        with self._lock:
+            row_values, positions, found = self._positions(state, actions)
+            if found.all():
+                row_values[positions] = new_values
+                return
+            merged = dict(zip(*self.rows.get(state, (_NO_ACTIONS, _NO_VALUES))))
+            merged.update(zip(actions.tolist(), new_values.tolist()))
+            row_actions = np.fromiter(sorted(merged), dtype=np.int64, count=len(merged))
+            self.rows[state] = (row_actions, np.array([merged[action] for action in row_actions.tolist()],
+                                                      dtype=np.float32))
+
+    def set(self, state: int, action: int, value: float) -> None:
+        self.set_row(state, {action: value})
+
+    def get(self, state: int, action: int) -> float:
+        row_values, positions, found = self._positions(state, np.array([action], dtype=np.int64))
+        return float(row_values[positions[0]]) if found[0] else self.fill
+
+    def take(self, state: int, actions: np.ndarray) -> np.ndarray:
+        """Values of `actions` in `state`, as an array aligned with `actions`."""
+        row_values, positions, found = self._positions(state, actions)
+        if not len(row_values):
+            return np.full(len(actions), self.fill, dtype=np.float32)
+        return np.where(found, row_values[positions], np.float32(self.fill))
+
+    def best(self, state: int, actions: np.ndarray) -> np.ndarray:
+        """Positions in `actions` holding the highest value for `state`, the ties to choose from."""
+        values = self.take(state, actions)
+        return np.flatnonzero(values == values.max())
+
+    def max(self, state: int) -> float:
+        """Highest value set in the row of `state`, 0 for a row without any."""
+        row_values = self.rows.get(state, (_NO_ACTIONS, _NO_VALUES))[1]
+        return float(row_values.max()) if len(row_values) else 0.0
+
+    def row(self, state: int) -> Dict[int, float]:
+        row_actions, row_values = self.rows.get(state, (_NO_ACTIONS, _NO_VALUES))
+        return dict(zip(row_actions.tolist(), row_values.tolist()))
+
+    def states(self) -> Iterable[int]:
+        return sorted(state for state, (actions, _) in self.rows.items() if len(actions))
+
+    def __str__(self) -> str:
+        return str({state: self.row(state) for state in self.states()})
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict
+
+from checkpoint import write_atomic
+from config import LogConfig
+from hmdriver2.driver import Driver
+
+logger = logging.getLogger(__name__)
+logger.addHandler(LogConfig.get_file_handler())
+
+DEFAULT_MAIN_ABILITY = "EntryAbility"
+
+
+def parse_app_info(app_info: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of a `bm dump -n` result that the tester uses."""
+    application_info = app_info.get("applicationInfo", {})
+    main_ability = DEFAULT_MAIN_ABILITY
+    for module in app_info.get("hapModuleInfos", []):
+        if module.get("mainAbility"):
+            main_ability = module["mainAbility"]
+            break
+    return {
+        "main_ability": main_ability,
+        "version_code": app_info.get("versionCode", application_info.get("versionCode")),
+        "version_name": app_info.get("versionName", application_info.get("versionName")),
+        "update_time": app_info.get("updateTime", application_info.get("updateTime")),
+        "modules": [module.get("moduleName") for module in app_info.get("hapModuleInfos", [])],
+    }
+
+
+class AppMetadataCache:
+    """
+    Bundle information read with `bm dump -n` once per install instead of on every access.
+
+    The metadata of a bundle is kept in `<path>/<bundle>/<version hash>.json`, `<path>/<bundle>/current` naming
+    the file of the installed version. The first access of a run reads the installed version from the device,
+    since the app may have been reinstalled outside of the tester; later accesses, and `invalidate` after an
+    install by the tester, go through the cache. `bm dump` is known to hang at times, it is given up after
+    `timeout` seconds; the metadata then falls back to the stored current or last version, or to the default
+    main ability for this run.
+    """
+
+    def __init__(self, d: Driver, path: str = "app_metadata", timeout: float = 10.0):
+        self.d = d
+        self.path = path
+        self.timeout = timeout
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+
+    def _directory(self, bundle: str) -> str:
+        return os.path.join(self.path, bundle)
+
+    def _read_hash(self, bundle: str, name: str) -> str | None:
+        try:
+            with open(os.path.join(self._directory(bundle), name), "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _read(self, bundle: str, name: str = "current") -> Dict[str, Any] | None:
+        version_hash = self._read_hash(bundle, name)
+        if version_hash is None:
+            return None
+        try:
+            with open(os.path.join(self._directory(bundle), f"{version_hash}.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _query(self, bundle: str) -> Dict[str, Any] | None:
+        app_info = self.d.get_app_info(bundle, timeout=self.timeout)
+        if not app_info:
+            return None
+        metadata = parse_app_info(app_info)
+        version = json.dumps([metadata["version_code"], metadata["version_name"], metadata["update_time"]])
+        metadata["version_hash"] = hashlib.sha1(version.encode("utf-8")).hexdigest()[:16]
+        directory = self._directory(bundle)
+        path = os.path.join(directory, f"{metadata['version_hash']}.json")
+        if self._read_hash(bundle, "current") == metadata["version_hash"] and os.path.exists(path):
+            return metadata
+        write_atomic(path, json.dumps(metadata, ensure_ascii=False, indent=2).encode("utf-8"))
+        write_atomic(os.path.join(directory, "current"), metadata["version_hash"].encode("utf-8"))
+        write_atomic(os.path.join(directory, "last"), metadata["version_hash"].encode("utf-8"))
+        logger.info(f"Read metadata of {bundle} version {metadata['version_name']} ({metadata['version_hash']})")
+        return metadata
+
+    def get(self, bundle: str) -> Dict[str, Any]:
+        metadata = self._metadata.get(bundle)
+        if metadata is None:
+            metadata = self._query(bundle)
+            if metadata is None:
+                metadata = self._read(bundle) or self._read(bundle, "last") or {"main_ability": DEFAULT_MAIN_ABILITY}
+                logger.warning(f"Could not read metadata of {bundle}, using {metadata}")
+            self._metadata[bundle] = metadata
+        return metadata
+
+    def main_ability(self, bundle: str) -> str:
+        return self.get(bundle)["main_ability"]
+
+    def invalidate(self, bundle: str) -> None:
+        """Forget the installed version of `bundle` after installing it, the next `get` reads it from the device."""
+        self._metadata.pop(bundle, None)
+        current = os.path.join(self._directory(bundle), "current")
+        if os.path.exists(current):
+            os.remove(current)
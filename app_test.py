@@ -12,18 +12,27 @@ import yaml
 from bs4 import BeautifulSoup
 
 import utils
+from action.action_registry import action_registry
 from action.detector.click_action_detector import ClickActionDetector
 from action.impl.back_action import BackAction
 from action.impl.click_action import ClickAction
 from action.impl.restart_action import RestartAction
 from action.window_action import WindowAction
 from agent.impl.q_learning_agent import QLearningAgent
+from agent.knowledge_base import KnowledgeBase
+from app_metadata import AppMetadataCache
+from checkpoint import Checkpointer, load_checkpoint
 from config import LogConfig
 from config.custom_json_encoder import CustomJSONEncoder
+from config.event_log import event_log
+from exploration_store import ExplorationStore
+from navigator import Navigator
+import hmdriver2.utils
 from hmdriver2.driver import Driver
 from state.impl.action_set_state import ActionSetState
 from state.impl.out_of_domain_state import OutOfDomainState
 from state.impl.same_url_state import SameUrlState
+from state.similarity_index import SimilarityIndex
 from state.window_state import WindowState
 
 logger = logging.getLogger(__name__)
@@ -33,7 +42,10 @@ CONFIG = {}
 
 
 class AppTest:
-    def __init__(self, serial: str, app: str, project_path: str, module_name: str, product_name: str, TIME):
+    STATE_MEMO_SIZE = 1024
+
+    def __init__(self, serial: str, app: str, project_path: str, module_name: str, product_name: str, TIME,
+                 resume: bool = False):
         super().__init__()
         self.d: Driver = Driver(serial)
         self.serial = serial
@@ -47,6 +59,8 @@ class AppTest:
         self.current_state: WindowState | None = None
         self.action_dict: dict[WindowAction, int] = {}
         self.state_dict: dict[WindowState, int] = {}
+        # Keys of state_dict in the order they were first seen, only ever appended to.
+        self.state_log: list[WindowState] = []
         self.page_count_dict: dict[str, int] = {}
         self.transition_record_list: list[tuple[WindowState, WindowAction, WindowState]] = []
         self.ability_count_dict: dict[str, int] = {}
@@ -59,9 +73,12 @@ class AppTest:
         self.state_count = 0
         self.similar_states = defaultdict(list)
         self.all_states = set()
+        self.state_memo = utils.LRUCache(self.STATE_MEMO_SIZE)
+        self.similarity_index = SimilarityIndex(threshold=0.80)
         self.module_name = module_name
         self.product_name = product_name
         profile_config = self.read_config()
+        self.app_metadata = AppMetadataCache(self.d, **(CONFIG.get("app_metadata") or {}))
         if self.use_ptg and self.project_path:
             self.get_ptg(self.project_path, self.module_name)
             if os.path.exists("PTG.json"):
@@ -70,14 +87,24 @@ class AppTest:
         if self.project_path:
             self.install_hap(self.app, self.project_path, self.module_name, self.product_name)
         self.agent = self.agent_class(self.d, self.app, self.ability_name, self.PTG, self.use_ptg, profile_config)
+        navigation_config = CONFIG.get("navigation") or {}
+        self.navigator = Navigator(self.d, self.app, self.ability_name, self.PTG,
+                                   navigation_config.get("deep_links"), navigation_config.get("router_param"))
+        self.knowledge: KnowledgeBase | None = None
         self.lock = threading.Lock()
         self.transition_record_count: dict[tuple[WindowState, WindowAction, WindowState], int] = defaultdict(int)
-        if os.path.exists("output"):
+        if os.path.exists("output") and not resume:
             os.removedirs("output")
         os.makedirs("output", exist_ok=True)
         os.makedirs("output/data", exist_ok=True)
-        if os.path.exists("output/coverage.csv"):
+        if os.path.exists("output/coverage.csv") and not resume:
             os.remove("output/coverage.csv")
+        self.store = ExplorationStore("output/exploration.db")
+        self.checkpointer = Checkpointer("output/checkpoint.pkl", self.snapshot, self.checkpoint_interval)
+        if resume:
+            self.resume()
+        # After resume: the restored run keeps its action ids, knowledge base actions are registered after them.
+        self.load_knowledge()
 
     def read_config(self):
         with open("settings.yaml", 'r') as file:
@@ -86,8 +113,15 @@ class AppTest:
             self.default_profile = CONFIG.get("default_profile", None)
             self.output_path = CONFIG.get("output_path", "output")
             self.record_interval = CONFIG.get("record_interval", 60)
+            self.checkpoint_interval = (CONFIG.get("checkpoint") or {}).get("interval", 60)
+            self.knowledge_config = CONFIG.get("knowledge") or {}
             self.test_time = CONFIG.get("test_time", 60)
             self.profiles = CONFIG.get("profiles", None)
+            settle_config = dict(CONFIG.get("settle") or {})
+            hmdriver2.utils.DELAY_TIME = settle_config.pop("delay_time", hmdriver2.utils.DELAY_TIME)
+            self.d.settler.configure(**settle_config)
+            self.d.restarter.configure(**(CONFIG.get("restart") or {}))
+            event_log.configure(**(CONFIG.get("log") or {}))
             for profile in self.profiles:
                 if profile.get("name", None) == self.default_profile:
                     agent_info = profile.get("agent", None)
@@ -102,59 +136,47 @@ class AppTest:
 
     @property
     def ability_name(self):
-        # 有时候bm dump会卡住
-        app_info = self.d.get_app_info(self.app)
-        abilities = app_info["hapModuleInfos"]
-        for ability in abilities:
-            if ability["mainAbility"]:
-                return ability["mainAbility"]
-        return "EntryAbility"
+        # 有时候bm dump会卡住, the cache reads it once per run with a timeout
+        return self.app_metadata.main_ability(self.app)
+
+    def click_through(self, xpaths: list[str]):
+        for xpath in xpaths:
+            self.d.wait_settled()
+            self.d.xpath(xpath).click_if_exists()
 
     def start_test(self):
         # self.d.stop_app(self.app)
         logger.info("Execution start")
         self.d.start_app(self.app, self.ability_name)
         if self.app == "com.itcast.pass_interview":
-            time.sleep(1.5)
-            self.d.xpath("//root[1]/Flex[1]/Tabs[1]/TabBar[1]/Column[4]").click_if_exists()
-            self.d.xpath("//root[1]/Flex[1]/Tabs[1]/Swiper[1]/TabContent[1]/Column[1]/Row[1]/Text[1]").click_if_exists()
-            self.d.xpath(
-                "//root[1]/Column[1]/Navigation[1]/NavBar[1]/NavBarContent[1]/Column[1]/Column[2]/Row[1]/Checkbox[1]").click_if_exists()
-            self.d.xpath(
-                "//root[1]/Column[1]/Navigation[1]/NavBar[1]/NavBarContent[1]/Column[1]/Column[2]/Button[1]").click_if_exists()
-            self.d.force_stop_app()
-            self.d.start_app(self.app, self.ability_name)
+            self.click_through([
+                "//root[1]/Flex[1]/Tabs[1]/TabBar[1]/Column[4]",
+                "//root[1]/Flex[1]/Tabs[1]/Swiper[1]/TabContent[1]/Column[1]/Row[1]/Text[1]",
+                "//root[1]/Column[1]/Navigation[1]/NavBar[1]/NavBarContent[1]/Column[1]/Column[2]/Row[1]/Checkbox[1]",
+                "//root[1]/Column[1]/Navigation[1]/NavBar[1]/NavBarContent[1]/Column[1]/Column[2]/Button[1]"])
+            self.d.restart_app(self.app, self.ability_name, warm=False)
         if self.app == "com.huawei.hmos.world":
-            time.sleep(1.5)
-            self.d.xpath("//root[1]/GridRow[1]/GridCol[1]/Column[1]/Row[1]/Button[2]").click_if_exists()
-            self.d.xpath("//root[1]/Column[1]/Stack[1]/Button[1]").click_if_exists()
-            self.d.xpath("//root[1]/Stack[1]/GridRow[1]/GridCol[1]/Column[1]/Button[1]").click_if_exists()
-            time.sleep(1)
-            self.d.xpath("//root[1]/Stack[1]/Scroll[1]/Column[1]/Button[1]").click_if_exists()
+            self.click_through([
+                "//root[1]/GridRow[1]/GridCol[1]/Column[1]/Row[1]/Button[2]",
+                "//root[1]/Column[1]/Stack[1]/Button[1]",
+                "//root[1]/Stack[1]/GridRow[1]/GridCol[1]/Column[1]/Button[1]",
+                "//root[1]/Stack[1]/Scroll[1]/Column[1]/Button[1]"])
         # if self.app == "com.legado.app" or self.app == "com.itcast.pass_interview":
-        time.sleep(1.5)
         # self.stop_event.wait(3)
+        self.d.wait_settled()
         action_list = self.action_detector.get_actions(self.d)
         ability_name, page_path = self.d.get_ability_and_page()
-        self.current_state = self.state_class(action_list, ability_name, page_path)
-        self.state_dict[SameUrlState(self.app, self.ability_name)] = 0
-        self.state_dict[OutOfDomainState(self.app, self.ability_name)] = 0
-        with self.lock:
-            for action in action_list:
-                self.action_dict.setdefault(action, 0)
-            self.state_dict[self.current_state] = 1
-            self.ability_count_dict[ability_name] = self.ability_count_dict.get(ability_name, 0) + 1
-            self.page_count_dict[page_path] = self.page_count_dict.get(page_path, 0) + 1
+        self.enter_start_state(action_list, ability_name, page_path)
         logger.info(f"Initial state: {self.current_state}")
         self.start_time = start_time = time.time()
         self.data_thread = threading.Thread(target=self.save_tmp_data)
         self.data_thread.daemon = True  # 将线程设置为守护线程，主线程退出时它也会退出
         self.data_thread.start()
+        self.checkpointer.start()
         pre_page_path = page_path
         while time.time() - start_time <= self.test_time:
             chosen_action = self.agent.get_action(self.current_state)
             logger.info(f"Chosen action: {chosen_action}")
-            print(f"Chosen action: {chosen_action}")
             with self.lock:
                 # if not isinstance(chosen_action, RestartAction):
                 # if isinstance(chosen_action, ClickAction):
@@ -162,14 +184,12 @@ class AppTest:
                 self.action_dict[chosen_action] = self.action_dict.get(chosen_action, 0) + 1
                 self.action_count += 1
 
-            with open("output/log.txt", "a") as f:
-                f.write(str(self.current_state) + "\n")
-                f.write(str(chosen_action) + "\n")
+            event_log.info("step", state=str(self.current_state), action=str(chosen_action))
             with self.lock:
                 prev_state_count = len(self.state_dict)
             chosen_action.execute(self.d)
             # if (self.app == "com.legado.app" or self.app == "com.itcast.pass_interview") and isinstance(chosen_action, RestartAction):
-            time.sleep(1.5)
+            self.d.wait_settled(f"{type(chosen_action).__name__}:{pre_page_path}")
             # pass
             # self.stop_event.wait(3)
             # 跳转到目前覆盖数最少的状态
@@ -200,20 +220,19 @@ class AppTest:
             # if check_result and self.same_page_count < 1000 and self.same_state_count < 5000:
             if check_result:
                 with self.lock:
-                    self.ability_count_dict[ability_name] = self.ability_count_dict.get(ability_name, 0) + 1
-                    self.page_count_dict[page_path] = self.page_count_dict.get(page_path, 0) + 1
+                    self.count_page(ability_name, page_path)
                 action_list = self.action_detector.get_actions(self.d)
                 with self.lock:
                     for action in action_list:
                         self.action_dict.setdefault(action, 0)
 
-                new_state = self.pre_process(self.state_class(action_list, ability_name, page_path))
+                new_state = self.observe_state(action_list, ability_name, page_path)
                 # print(f"new_state: {self.agent.state_abstraction(new_state)}")
                 if pre_page_path == page_path:
                     self.same_page_count += 1
                 else:
                     self.same_page_count = 0
-                print(f"page transition: {pre_page_path}, {chosen_action} -> {page_path}")
+                event_log.debug("page transition", source=pre_page_path, action=str(chosen_action), target=page_path)
                 if self.use_ptg:
                     self.update_ptg(pre_page_path, page_path, chosen_action)
                 pre_page_path = page_path
@@ -222,7 +241,7 @@ class AppTest:
             else:
                 self.same_page_count = 0
                 self.same_state_count = 0
-                print(f"{chosen_action} -> OutOfDomainState")
+                event_log.info("out of domain", action=str(chosen_action))
                 new_state = OutOfDomainState(self.app, self.ability_name)
                 # self.transit(chosen_action, new_state)
             # else:
@@ -239,81 +258,83 @@ class AppTest:
                 self.state_count += 1
             else:
                 self.state_count = 0
-            print(f"prev_state_count: {prev_state_count}, curr_state_count: {curr_state_count}")
+            event_log.debug("state count", prev_state_count=prev_state_count, curr_state_count=curr_state_count)
             if self.use_dfa and (self.state_count >= 7 or self.same_page_count >= 14):
                 # print(f"prev_state_count: {prev_state_count}, curr_state_count: {curr_state_count}")
                 # if random.random() < 0.2:
-                print(f"{self.state_count, self.same_page_count}, restart!")
-                with open("output/log.txt", "a") as f:
-                    f.write(f"{self.state_count, self.same_page_count}" + "\n")
+                event_log.info("restart", state_count=self.state_count, same_page_count=self.same_page_count)
                 self.action_count += 1
-                RestartAction(self.app, self.ability_name).execute(self.d)
-                # if (self.app == "com.legado.app" or self.app == "com.itcast.pass_interview") and isinstance(chosen_action, RestartAction):
-                time.sleep(1.5)
-                # self.stop_event.wait(3)
+                target_page = self.recovery_target()
+                jumped = self.navigator.jump(target_page)
+                if not jumped:
+                    RestartAction(self.app, self.ability_name).execute(self.d)
+                    # if (self.app == "com.legado.app" or self.app == "com.itcast.pass_interview") and isinstance(chosen_action, RestartAction):
+                    # self.stop_event.wait(3)
+                    self.d.wait_settled(f"{RestartAction.__name__}:{pre_page_path}")
                 action_list = self.action_detector.get_actions(self.d)
                 ability_name, page_path = self.d.get_ability_and_page()
-                self.ability_count_dict[ability_name] = self.ability_count_dict.get(ability_name, 0) + 1
-                self.page_count_dict[page_path] = self.page_count_dict.get(page_path, 0) + 1
+                self.count_page(ability_name, page_path)
                 self.prev_state = None
-                self.current_state = self.pre_process(self.state_class(action_list, ability_name, page_path))
+                self.current_state = self.observe_state(action_list, ability_name, page_path)
                 self.agent.previous_state = self.agent.previous_action = None
                 # if random.random() < 0.5:
-                actions = self.get_shortest_path(self.current_state, ability_name, page_path)
+                actions = [] if jumped else self.get_shortest_path(self.current_state, page_path, target_page)
                 # actions = []
                 if actions:
-                    print("start recover")
-                    with open("output/log.txt", "a") as f:
-                        f.write(
-                            f"prev_state_count: {prev_state_count}, curr_state_count: {curr_state_count}, start recover\n")
+                    event_log.info("start recover", prev_state_count=prev_state_count,
+                                   curr_state_count=curr_state_count)
                 for action in actions:
                     with self.lock:
                         self.action_dict[action] = self.action_dict.get(action, 0) + 1
                     action.execute(self.d)
+                    self.d.wait_settled(f"{type(action).__name__}:{page_path}")
                     self.action_count += 1
-                    with open("output/log.txt", "a") as f:
-                        f.write(f"recover action: {action}\n")
-                    print(f"recover action: {action}")
+                    event_log.info("recover action", action=str(action))
                     # self.stop_event.wait(0.5)
                     self.prev_state = self.current_state
                     ability_name, page_path = self.d.get_ability_and_page()
                     action_list = self.action_detector.get_actions(self.d)
-                    self.current_state = self.pre_process(self.state_class(action_list, ability_name, page_path))
+                    self.current_state = self.observe_state(action_list, ability_name, page_path)
                     self.transition_record_count[(self.prev_state, action, self.current_state)] += 1
                     if isinstance(self.agent, QLearningAgent):
                         self.agent.previous_state = self.agent.get_state_index(self.current_state)
                         self.agent.previous_action = self.agent.get_action_index(action)
                     self.agent.state_count[self.agent.get_state_index(self.current_state)] += 1
                     self.agent.action_count[self.agent.get_action_index(action)] += 1
-                    self.ability_count_dict[ability_name] = self.ability_count_dict.get(ability_name, 0) + 1
-                    self.page_count_dict[page_path] = self.page_count_dict.get(page_path, 0) + 1
+                    self.count_page(ability_name, page_path)
                 with self.lock:
-                    self.state_dict[self.current_state] = self.state_dict.get(self.current_state, 0) + 1
+                    self.count_state(self.current_state)
                     actions = self.action_detector.get_actions(self.d)
                     for action in actions:
                         self.action_dict.setdefault(action, 0)
                 self.state_count = self.same_page_count = 0
                 action_list = self.action_detector.get_actions(self.d)
                 ability_name, page_path = self.d.get_ability_and_page()
-                self.prev_state = self.current_state = self.pre_process(
-                    self.state_class(action_list, ability_name, page_path))
+                self.prev_state = self.current_state = self.observe_state(action_list, ability_name, page_path)
                 # self.state_dict[self.current_state] = self.state_dict.get(self.current_state, 0) + 1
         self.data_thread.join()
         self.save_final_data()
-        # self.d.stop_app(self.app)
-        self.d.force_stop_app()
+        self.d.stop_app(self.app)
         if self.project_path:
             self.get_coverage(self.module_name, self.test_time)
 
+    def count_state(self, state: WindowState, visits: int = 1) -> None:
+        """Add `visits` to the count of `state`, logging it if it is new. The caller holds `self.lock`."""
+        count = self.state_dict.get(state)
+        if count is None:
+            self.state_log.append(state)
+            count = 0
+        self.state_dict[state] = count + visits
+        self.store.record_state(state, visits)
+
+    def count_page(self, ability_name: str, page_path: str) -> None:
+        self.ability_count_dict[ability_name] = self.ability_count_dict.get(ability_name, 0) + 1
+        self.page_count_dict[page_path] = self.page_count_dict.get(page_path, 0) + 1
+        self.store.record_page_visit(ability_name, page_path)
+
     def add_new_state_to_list(self, new_state: WindowState):
-        for state in self.state_dict.keys():
-            if state == new_state:
-                with self.lock:
-                    self.state_dict[state] += 1
-                    # self.state_dict[state] = self.state_dict.get(state, 0) + 1
-                    return state
         with self.lock:
-            self.state_dict[new_state] = 1
+            self.count_state(new_state)
         # new_state_abstraction = self.agent.state_abstraction(new_state)
         # self.state_dict[new_state_abstraction] = self.state_dict.get(new_state_abstraction, 0) + 1
         # if new_state_abstraction in self.state_dict:
@@ -332,9 +353,12 @@ class AppTest:
             self.same_state_count += 1
         else:
             self.same_state_count = 0
-        print(f"previous state: {self.prev_state}, current state: {self.current_state}")
+        event_log.debug("transit", previous_state=str(self.prev_state), current_state=str(self.current_state))
         with self.lock:
             self.transition_record_list.append((self.prev_state, chosen_action, self.current_state))
+        self.store.record_transition(self.prev_state, chosen_action, self.current_state,
+                                     getattr(self.prev_state, "page_path", None),
+                                     getattr(self.current_state, "page_path", None))
         self.transition_record_count[(self.prev_state, chosen_action, self.current_state)] += 1
         self.update_dfa(self.prev_state, self.current_state, chosen_action)
 
@@ -342,7 +366,6 @@ class AppTest:
         if page_path not in self.PTG:
             self.PTG[page_path] = []
         if isinstance(chosen_action, ClickAction) and pre_page_path != page_path:
-            print({"component": chosen_action.location, "action": "click", "targetPage": page_path})
             exist = False
             for obj in self.PTG[pre_page_path]:
                 c, t = obj["component"], obj["targetPage"]
@@ -350,7 +373,7 @@ class AppTest:
                     exist = True
                     break
             if not exist:
-                print(f"updatePTG: component: {chosen_action.location}, action: click, targetPage: {page_path}")
+                event_log.info("update ptg", component=chosen_action.location, target=page_path)
                 self.PTG[pre_page_path].append(
                     {"component": chosen_action.location, "action": "click", "targetPage": page_path})
 
@@ -366,12 +389,32 @@ class AppTest:
         if not isinstance(chosen_action, BackAction) and prev_state != current_state:
             if chosen_action in self.DFA[prev_state] and self.DFA[prev_state][chosen_action] == current_state:
                 return
-            print(f"updateDFA: prev_state: {prev_state}, current_state: {current_state}")
+            event_log.debug("update dfa", prev_state=str(prev_state), current_state=str(current_state))
             self.DFA[prev_state][chosen_action] = current_state
         # print(self.DFA)
 
+    def recovery_target(self) -> str | None:
+        """The page recovery heads for: the least visited page, or the page with the most PTG edges out."""
+        if len(self.page_count_dict) == 0:
+            return None
+        if random.random() < 0.5:
+            target_page = min([page_name for page_name in self.page_count_dict.keys()], key=self.page_count_dict.get,
+                              default=None)
+            # target_page = random.choice(temp)
+            event_log.info("recover target", min_count=self.page_count_dict.get(target_page), target_page=target_page)
+        else:
+            out_degrees = defaultdict(int)
+            for source_page, actions in self.PTG.items():
+                for action in actions:
+                    target_page = action.get("targetPage")
+                    if target_page and source_page != target_page:
+                        out_degrees[source_page] += 1
+            target_page = max([page_name for page_name in out_degrees.keys()], key=out_degrees.get, default=None)
+            event_log.info("recover target", max_out_degree=out_degrees.get(target_page), target_page=target_page)
+        return target_page
+
     # 无边权BFS求最短路
-    def get_shortest_path(self, current_state, ability_name, page_path) -> list[WindowAction]:
+    def get_shortest_path(self, current_state, page_path, target_page) -> list[WindowAction]:
         # dist: dict[WindowState, int] = defaultdict(lambda: len(self.state_dict))
         if current_state not in self.DFA:
             return []
@@ -390,8 +433,6 @@ class AppTest:
         # arr = [(prev_state, chosen_action, curr_state) for (prev_state, chosen_action, curr_state), cnt in
         #            self.transition_record_count.items() if
         #            cnt > 0 and isinstance(chosen_action, ClickAction) and prev_state != curr_state]
-        if len(self.page_count_dict) == 0:
-            return []
         # min_count = min(page_cnt for page_name, page_cnt in self.page_count_dict.items())
         # if arr is None:
         #     return []
@@ -406,26 +447,6 @@ class AppTest:
         #     if page_cnt == min_count:
         #         temp.append(page_name)
 
-        if random.random() < 0.5:
-            target_page = min([page_name for page_name in self.page_count_dict.keys()], key=self.page_count_dict.get,
-                              default=None)
-            # target_page = random.choice(temp)
-            print("min_count", self.page_count_dict[target_page])
-            print("target_page", target_page)
-            with open("output/log.txt", "a") as f:
-                f.write(f"min_count: {self.page_count_dict[target_page]}, target_page: {target_page}" + "\n")
-        else:
-            out_degrees = defaultdict(int)
-            for source_page, actions in self.PTG.items():
-                for action in actions:
-                    target_page = action.get("targetPage")
-                    if target_page and source_page != target_page:
-                        out_degrees[source_page] += 1
-            target_page = max([page_name for page_name in out_degrees.keys()], key=out_degrees.get, default=None)
-            print("max_out_degree", out_degrees[target_page])
-            print("target_page", target_page)
-            with open("output/log.txt", "a") as f:
-                f.write(f"max_out_degree: {out_degrees[target_page]}, target_page: {target_page}" + "\n")
         if target_page is None:
             return []
         target_state = None
@@ -457,41 +478,53 @@ class AppTest:
             path.append(action)
         path.reverse()
         # path.append(target_action)
-        print("recover path: ", path)
-        with open("output/log.txt", "a") as f:
-            f.write(f"{str(path)}\n")
+        event_log.info("recover path", path=[str(action) for action in path])
         return path
 
+    def enter_start_state(self, action_list: list[WindowAction], ability_name: str, page_path: str) -> None:
+        """Make the screen shown after launching the app the current state and count it."""
+        # Through the similarity index like every later screen, so near duplicates of it merge into it.
+        self.current_state = self.observe_state(action_list, ability_name, page_path)
+        with self.lock:
+            self.count_state(SameUrlState(self.app, self.ability_name), 0)
+            self.count_state(OutOfDomainState(self.app, self.ability_name), 0)
+            for action in action_list:
+                self.action_dict.setdefault(action, 0)
+            self.count_state(self.current_state)
+            self.count_page(ability_name, page_path)
+
+    def observe_state(self, action_list: list[WindowAction], ability_name: str, page_path: str) -> WindowState:
+        """
+        The canonical state of the current screen. Screens already seen (same layout digest) map straight to
+        the state they were merged into, without running the similarity search again.
+        """
+        digest = self.d.observation.digest
+        state = self.state_memo.get(digest)
+        if state is None:
+            state = self.pre_process(self.state_class(action_list, ability_name, page_path))
+            self.state_memo.put(digest, state)
+        return state
+
     def pre_process(self, new_state: WindowState) -> WindowState:
         self.all_states.add(new_state)
         if not isinstance(new_state, ActionSetState):
             return new_state
         with self.lock:
-            for state in self.state_dict.keys():
-                if not isinstance(state, ActionSetState):
-                    continue
-                similarity = state.similarity(new_state)
-                if similarity >= 0.80:
-                    print("similarity: ", similarity)
-                    print(self.agent.state_abstraction(state))
-                    print(self.agent.state_abstraction(new_state))
-                    self.similar_states[state].append(new_state)
-                    return state
-                for similar_state in self.similar_states[state]:
-                    similarity = similar_state.similarity(new_state)
-                    if similarity >= 0.80:
-                        print("similarity: ", similarity)
-                        print(self.agent.state_abstraction(state))
-                        print(self.agent.state_abstraction(new_state))
-                        self.similar_states[state].append(new_state)
-                        return state
-
-            print("new_state: ", self.agent.state_abstraction(new_state))
+            match = self.similarity_index.query(new_state)
+            if match is not None:
+                state, similarity = match
+                event_log.debug("similar state", similarity=similarity, state=str(state))
+                self.similar_states[state].append(new_state)
+                self.similarity_index.add(state, new_state)
+                return state
+
+            event_log.debug("new state", state=str(new_state))
+            self.similarity_index.add(new_state, new_state)
             return new_state
 
     def check_valid_state(self):
-        app, ability_name = self.d.current_app()
-        return app == self.app and ability_name != ""
+        app, ability_name = self.d.foreground_app()
+        return app == self.app and bool(ability_name)
 
     def save_final_data(self):
         # with open(f"{self.app}_q-learning_{TIME}s.txt", "a") as f:
@@ -526,8 +559,132 @@ class AppTest:
             pickle.dump(self.all_states, f)
         with open("output/states.pkl", "wb") as f:
             pickle.dump(self.state_dict, f)
+        # Actions in registry id order, the ids that q_table.json and the exploration store refer to.
+        with open("output/actions.pkl", "wb") as f:
+            pickle.dump(action_registry.actions, f)
         with open(f"output/similar_states.pkl", "wb") as f:
             pickle.dump(self.similar_states, f)
+        if isinstance(self.agent, QLearningAgent):
+            self.agent.dump_q_table("output/q_table.json")
+        self.save_knowledge()
+        self.save_progress()
+        self.checkpointer.stop()
+        self.checkpointer.save()
+        self.store.flush()
+        event_log.flush()
+
+    @property
+    def q_learning_agent(self) -> QLearningAgent | None:
+        if isinstance(self.agent, QLearningAgent):
+            return self.agent
+        return getattr(self.agent, "q_learning_agent", None)
+
+    def load_knowledge(self):
+        """Warm-start the Q-values and the DFA from earlier runs of this app."""
+        if not self.knowledge_config.get("enabled", False):
+            return
+        agent = self.q_learning_agent
+        self.knowledge = KnowledgeBase(self.knowledge_config.get("path", "knowledge"), self.app,
+                                       agent.INITIAL_Q_VALUE if agent is not None else 10.0,
+                                       self.knowledge_config.get("decay", 0.8),
+                                       self.knowledge_config.get("max_age", 10))
+        if agent is not None:
+            agent.knowledge = self.knowledge
+        for prev_state, action, state in self.knowledge.dfa_edges():
+            self.DFA.setdefault(prev_state, {}).setdefault(action, state)
+            self.DFA.setdefault(state, {})
+
+    def save_knowledge(self):
+        if self.knowledge is None:
+            return
+        agent = self.q_learning_agent
+        try:
+            self.knowledge.save(agent.learned_rows() if agent is not None else [], self.DFA)
+        except OSError as e:
+            logger.warning(f"Knowledge base not saved: {e}")
+
+    def save_progress(self):
+        """Store the counters that `resume` needs next to the recorded graph; the agent tables go to checkpoints."""
+        self.store.set_meta("counters", {"action_count": self.action_count, "time": time.time()})
+
+    def snapshot(self) -> dict:
+        """Copies of the agent tables, the graphs, the counters and the RNG state for a checkpoint."""
+        # The main thread keeps exploring: take each container with one C-level copy, never iterate a live one.
+        dfa = list(self.DFA.items())
+        ptg = list(self.PTG.items())
+        with self.lock:
+            checkpoint = {
+                "time": time.time(),
+                "actions": list(action_registry.actions),
+                "ability_count": self.ability_count_dict.copy(),
+                "page_count": self.page_count_dict.copy(),
+                "action_count": self.action_count,
+                "transition_record_count": dict(self.transition_record_count),
+            }
+        checkpoint["DFA"] = {state: edges.copy() for state, edges in dfa}
+        checkpoint["PTG"] = {page: list(edges) for page, edges in ptg}
+        checkpoint["agent"] = self.agent.export_tables()
+        checkpoint["random_state"] = random.getstate()
+        return checkpoint
+
+    def apply_checkpoint(self, checkpoint: dict):
+        with self.lock:
+            for state, edges in checkpoint["DFA"].items():
+                self.DFA.setdefault(state, {}).update(edges)
+            for page_path, edges in checkpoint["PTG"].items():
+                known = self.PTG.setdefault(page_path, [])
+                known.extend(edge for edge in edges if edge not in known)
+            # Recovery actions are only counted here, the store has the transitions of the main loop.
+            for key, count in checkpoint["transition_record_count"].items():
+                self.transition_record_count[key] = max(self.transition_record_count[key], count)
+            self.action_count = max(self.action_count, checkpoint["action_count"])
+        self.agent.import_tables(checkpoint["agent"])
+        random.setstate(checkpoint["random_state"])
+
+    def resume(self):
+        """
+        Rebuild the explored graph (states, transitions, DFA, PTG) and the counters from the store of an
+        interrupted run, without touching the device. The latest checkpoint, when there is one, adds the agent
+        tables and the RNG state.
+        """
+        run = self.store.load()
+        checkpoint = load_checkpoint(self.checkpointer.path)
+        actions = run["actions"]
+        if checkpoint is not None and len(checkpoint["actions"]) > len(actions):
+            actions = checkpoint["actions"]
+        action_registry.restore(actions)
+        states = run["states"]
+        with self.lock:
+            for state_id, (state, visits) in states.items():
+                self.state_dict[state] = visits
+                self.state_log.append(state)
+                self.store.state_ids[state] = state_id
+                if isinstance(state, ActionSetState):
+                    self.similarity_index.add(state, state)
+            for from_id, action_id, to_id, from_page, to_page in run["transitions"]:
+                if to_id not in states:
+                    continue
+                prev_state = states[from_id][0] if from_id in states else None
+                action = action_registry.get(action_id) if action_id is not None else None
+                state = states[to_id][0]
+                self.transition_record_list.append((prev_state, action, state))
+                self.transition_record_count[(prev_state, action, state)] += 1
+                if action is not None:
+                    self.action_dict[action] = self.action_dict.get(action, 0) + 1
+                self.update_dfa(prev_state, state, action)
+                if self.use_ptg and isinstance(state, ActionSetState) and from_page in self.PTG:
+                    self.update_ptg(from_page, to_page, action)
+            for action in action_registry:
+                self.action_dict.setdefault(action, 0)
+            for ability_name, page_path, count in run["page_visits"]:
+                self.ability_count_dict[ability_name] = self.ability_count_dict.get(ability_name, 0) + count
+                self.page_count_dict[page_path] = self.page_count_dict.get(page_path, 0) + count
+        meta = run["meta"]
+        counters = meta.get("counters", {})
+        self.action_count = counters.get("action_count", len(run["transitions"]))
+        if checkpoint is not None:
+            self.apply_checkpoint(checkpoint)
+        logger.info(f"Resumed {len(states)} states and {len(run['transitions'])} transitions")
 
     def save_tmp_data(self):
         t = 0
@@ -547,6 +704,7 @@ class AppTest:
                         "all_state_count": len(self.all_states)
                     }, f, indent=4, sort_keys=True,
                 )
+            self.save_progress()
             for _ in range(self.record_interval):
                 if time.time() - self.start_time > self.test_time:
                     break
@@ -561,6 +719,7 @@ class AppTest:
         os.system(f"cd {project_path} & {del_cmd} & {instrument_cmd}")
         self.d.uninstall_app(app)
         self.d.install_app(signed_hap)
+        self.app_metadata.invalidate(app)
 
     def get_ptg(self, project_path, module_name):
         if os.path.exists("./PTG.json"):
@@ -603,6 +762,7 @@ class AppTest:
         except Exception as e:
             line = f"0,0%;0/1,0%;0/1,0%;0/1,0%;0/1\n"
         print("Coverage: ", line)
+        self.store.record_coverage(t, *line.strip().split(",")[1:])
         with open("output/coverage.csv", "a") as f:
             f.write("time,statement,branch,function,line\n")
             f.write(line)
@@ -0,0 +1,80 @@
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Union
+
+from config import LogConfig
+
+logger = logging.getLogger(__name__)
+logger.addHandler(LogConfig.get_file_handler())
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Replace `path` with `data` so that a crash leaves either the old or the new file, never a partial one."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path), suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_checkpoint(path: str) -> Union[Dict[str, Any], None]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class Checkpointer:
+    """
+    Saves `snapshot()` to `path` every `interval` seconds from a background thread.
+
+    `snapshot` runs on the checkpoint thread and should only copy what it needs; pickling and writing happen
+    after it returns, so exploration is only held up for the copy. An interval of 0 disables the periodic
+    saves, `save` still writes one on demand.
+    """
+
+    def __init__(self, path: str, snapshot: Callable[[], Dict[str, Any]], interval: float = 60):
+        self.path = path
+        self.snapshot = snapshot
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._save_lock = threading.Lock()
+        self._thread: Union[threading.Thread, None] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="checkpoint")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                logger.warning(f"Checkpoint failed: {e}")
+
+    def save(self) -> None:
+        with self._save_lock:
+            data = pickle.dumps(self.snapshot(), protocol=pickle.HIGHEST_PROTOCOL)
+            write_atomic(self.path, data)
+        logger.info(f"Checkpoint saved to {self.path}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
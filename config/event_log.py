@@ -0,0 +1,136 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Tuple, Union
+
+_Record = Tuple[float, int, str, Dict[str, Any]]
+
+
+class EventLog:
+    """
+    Run log of the exploration loop (`output/log.txt`), written by a background thread.
+
+    Callers only enqueue an event name and its fields; records below `level` are dropped before anything is
+    formatted. The writer keeps one handle open, formats and writes whatever has queued up, and flushes once
+    per batch (at most every `flush_interval` seconds). With `jsonl` set, every record is also written as
+    one JSON object per line to `jsonl_path`.
+    """
+
+    def __init__(self, path: str = "output/log.txt", level: int = logging.INFO, jsonl: bool = False,
+                 jsonl_path: str = "output/events.jsonl", flush_interval: float = 1.0):
+        self.path = path
+        self.level = level
+        self.jsonl = jsonl
+        self.jsonl_path = jsonl_path
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Union[_Record, None]]" = queue.Queue()
+        self._thread: Union[threading.Thread, None] = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def configure(self, level: Union[int, str, None] = None, jsonl: Union[bool, None] = None,
+                  flush_interval: Union[float, None] = None) -> None:
+        if level is not None:
+            self.level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+        if jsonl is not None:
+            self.jsonl = jsonl
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, level: int, event: str, **fields: Any) -> None:
+        if level < self.level:
+            return
+        if self._thread is None:
+            self._start()
+        self._queue.put((time.time(), level, event, fields))
+
+    def debug(self, event: str, **fields: Any) -> None:
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        self.log(logging.WARNING, event, **fields)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-log")
+                self._thread.daemon = True
+                self._thread.start()
+
+    @staticmethod
+    def _open(path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _format(event: str, fields: Dict[str, Any]) -> str:
+        if not fields:
+            return event
+        return f"{event}: " + ", ".join(f"{key}={value}" for key, value in fields.items())
+
+    def _run(self) -> None:
+        text_file = jsonl_file = None
+        stopped = False
+        while not stopped:
+            try:
+                batch: List[Union[_Record, None]] = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines, records = [], []
+            for record in batch:
+                if record is None:
+                    stopped = True
+                    continue
+                timestamp, level, event, fields = record
+                lines.append(self._format(event, fields) + "\n")
+                if self.jsonl:
+                    records.append(json.dumps({"time": timestamp, "level": logging.getLevelName(level),
+                                               "event": event, **fields}, default=str) + "\n")
+            try:
+                if lines:
+                    text_file = text_file or self._open(self.path)
+                    text_file.writelines(lines)
+                    text_file.flush()
+                if records:
+                    jsonl_file = jsonl_file or self._open(self.jsonl_path)
+                    jsonl_file.writelines(records)
+                    jsonl_file.flush()
+            except OSError as e:
+                logging.getLogger(__name__).warning(f"Event log write failed: {e}")
+            for _ in batch:
+                self._queue.task_done()
+        for f in (text_file, jsonl_file):
+            if f is not None:
+                f.close()
+
+    def flush(self) -> None:
+        """Block until everything logged so far is written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+
+event_log = EventLog()
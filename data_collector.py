@@ -7,11 +7,10 @@ from datetime import datetime
 
 from bs4 import BeautifulSoup
 
-from action.impl.back_action import BackAction
-from action.impl.restart_action import RestartAction
+from action.action_registry import action_registry
 from config import LogConfig
-from state.impl.out_of_domain_state import OutOfDomainState
-from state.impl.same_url_state import SameUrlState
+from state.impl.action_set_state import ActionSetState
+from state.window_state import WindowState
 from app_test import AppTest
 
 logger = logging.getLogger(__name__)
@@ -28,8 +27,16 @@ class DataCollector(threading.Thread):
         self.project_path = project_path
         self.stop_event = threading.Event()
         self.count = 0
-        os.makedirs(os.path.join(self.output_path, "data"), exist_ok=True)
+        os.makedirs(os.path.join(self.output_path, "data", "segments"), exist_ok=True)
         os.makedirs(os.path.join(self.output_path, "pickles"), exist_ok=True)
+        # Progress of save_data through the append-only logs, see save_data.
+        self.action_cursor = 0
+        self.transition_cursor = 0
+        self.state_ids: dict[WindowState, int] = {}
+        # Visits per state id and executions per action id up to the previous segment.
+        self.state_visits: dict[int, int] = {}
+        self.action_executions: dict[int, int] = {}
+        self.segments: list[str] = []
         if os.path.exists(os.path.join(self.output_path, "coverage.csv")):
             os.remove(os.path.join(self.output_path, "coverage.csv"))
         with open(os.path.join(self.output_path, "coverage.csv"), "w", encoding="utf-8") as f:
@@ -47,70 +54,93 @@ class DataCollector(threading.Thread):
             # self.count += 1
             self.save_data(finish=True)
 
+    def _state_record(self, state_id: int, state) -> dict:
+        if isinstance(state, ActionSetState):
+            return {"type": "state", "id": state_id, "info": str(state), **state.to_dict()}
+        return {"type": "state", "id": state_id, "info": str(state),
+                "actions": action_registry.ids_of(state.get_action_list())}
+
+    def _write_manifest(self, name: str, manifest: dict):
+        path = os.path.join(self.output_path, "data", name)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=4, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
     def save_data(self, finish=False):
-        with self.app_test.lock:
-            action_list = sorted(self.app_test.action_dict.keys())
-            action_list_with_execution_time = [(str(key), self.app_test.action_dict[key]) for key in action_list]
-            state_list = sorted(self.app_test.state_dict.keys())
-            state_dict_list = []
-            for state in state_list:
-                if not isinstance(state, OutOfDomainState) and not isinstance(state, SameUrlState):
-                    action_list_in_state = state.get_action_list()
-                    action_index_list = []
-                    for action in action_list_in_state:
-                        action_index_list.append(action_list.index(action))
-                    state_dict = {"info": str(state), "action_list": action_index_list,
-                                  "visited_time": self.app_test.state_dict[state]}
-                    state_dict_list.append(state_dict)
-                else:
-                    state_dict_list.append({"info": str(state), "action_list": list(map(str, state.get_action_list())),
-                                            "visited_time": self.app_test.state_dict[state]})
-            page_count_dict = self.app_test.page_count_dict.copy()
-            transition_tuple_list = []
-            for transition_record in self.app_test.transition_record_list:
-                if transition_record[1] is None:
-                    action_index_transition_record = None
-                elif isinstance(transition_record[1], RestartAction) or isinstance(transition_record[1], BackAction):
-                    action_index_transition_record = str(transition_record[1])
-                else:
-                    action_index_transition_record = action_list.index(transition_record[1])
-                transition_tuple_list.append((state_list.index(transition_record[0]) if transition_record[
-                                                                                            0] is not None else None,
-                                              action_index_transition_record,
-                                              state_list.index(transition_record[2])))
-
-        with open(os.path.join(self.output_path, "data", f"{self.count * self.record_interval}" + ".json"),
-                  "w") as f:
-            json.dump(
-                {"action_list": action_list_with_execution_time, "state_list": state_dict_list,
-                 "page_count": page_count_dict,
-                 "transition_list": transition_tuple_list,
-                 "action_count": self.app_test.action_count}, f, indent=4, sort_keys=True,
-            )
-
-        states = [state for state in state_list]
-        with open(os.path.join(self.output_path, "pickles", f"{self.count * self.record_interval}" + ".pkl"),
-                  "wb") as f:
-            pickle.dump(states, f)
-
-        with open(os.path.join(self.output_path, "data", "newest" + ".json"), "w") as f:
-            json.dump(
-                {"action_list": action_list_with_execution_time, "state_list": state_dict_list,
-                 "page_count": page_count_dict,
-                 "transition_list": transition_tuple_list,
-                 "action_count": self.app_test.action_count}, f, indent=4, sort_keys=True)
-        with open(os.path.join(self.output_path, "pickles", "newest.pkl"), "wb") as f:
-            pickle.dump(states, f)
+        """
+        Append what happened since the previous call as a new segment and write a manifest of all segments.
+
+        A segment (`data/segments/<n>.jsonl`) holds one record per line: the actions registered, the states first
+        seen and the transitions taken since the previous segment, and how many visits of each state and
+        executions of each action were added (`visits` and `executions` records, summed over the segments they
+        give `visited_time` and the execution count). Actions and states are referred to by id. The action objects
+        themselves are appended to `pickles/actions.pkl`, one pickled list per segment. The manifests
+        (`data/<time>.json`, `data/newest.json`) only list the segments and the current counters.
+        """
+        app_test = self.app_test
+        # The logs are append-only: under the lock only their lengths, one C-level copy of each counter dict
+        # and the small counters are read.
+        with app_test.lock:
+            state_end = len(app_test.state_log)
+            transition_end = len(app_test.transition_record_list)
+            state_dict = app_test.state_dict.copy()
+            action_dict = app_test.action_dict.copy()
+            page_count_dict = app_test.page_count_dict.copy()
+            action_count = app_test.action_count
+
+        records = []
+        for state in app_test.state_log[len(self.state_ids):state_end]:
+            state_id = self.state_ids[state] = len(self.state_ids)
+            records.append(self._state_record(state_id, state))
+        for prev_state, action, state in app_test.transition_record_list[self.transition_cursor:transition_end]:
+            records.append({"type": "transition",
+                            "from": self.state_ids.get(prev_state) if prev_state is not None else None,
+                            "action": action_registry.id_of(action) if action is not None else None,
+                            "to": self.state_ids.get(state)})
+        for state, visits in state_dict.items():
+            state_id = self.state_ids[state]
+            delta = visits - self.state_visits.get(state_id, 0)
+            if delta:
+                records.append({"type": "visits", "state": state_id, "delta": delta})
+                self.state_visits[state_id] = visits
+        for action, executions in action_dict.items():
+            action_id = action_registry.id_of(action)
+            delta = executions - self.action_executions.get(action_id, 0)
+            if delta:
+                records.append({"type": "executions", "action": action_id, "delta": delta})
+                self.action_executions[action_id] = executions
+        # Actions go last: recording the states, transitions and counts may have registered some.
+        action_end = len(action_registry)
+        new_actions = action_registry.actions[self.action_cursor:action_end]
+        records[:0] = [{"type": "action", "id": action_id, "info": str(action)}
+                       for action_id, action in enumerate(new_actions, self.action_cursor)]
+        self.action_cursor, self.transition_cursor = action_end, transition_end
+
+        if records:
+            segment = f"{len(self.segments)}.jsonl"
+            with open(os.path.join(self.output_path, "data", "segments", segment), "w") as f:
+                f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+            self.segments.append(segment)
+        if new_actions:
+            with open(os.path.join(self.output_path, "pickles", "actions.pkl"), "ab") as f:
+                pickle.dump(new_actions, f)
+
+        manifest = {"time": self.count * self.record_interval, "segments": self.segments,
+                    "action_number": self.action_cursor, "state_number": len(self.state_ids),
+                    "transition_number": self.transition_cursor, "page_count": page_count_dict,
+                    "action_count": action_count}
+        self._write_manifest(f"{self.count * self.record_interval}.json", manifest)
+        self._write_manifest("newest.json", manifest)
 
         # if self.project_path:
         #     self.get_coverage()
 
         if finish:
             with open(os.path.join(self.output_path, "ptg.json"), "w") as f:
-                json.dump(self.app_test.PTG, f, ensure_ascii=False, indent=2)
+                json.dump(app_test.PTG, f, ensure_ascii=False, indent=2)
 
             with open(os.path.join(self.output_path, "dfa.pkl"), "wb") as f:
-                pickle.dump(self.app_test.DFA, f)
+                pickle.dump(app_test.DFA, f)
 
         logger.info("Data saved successfully")
 
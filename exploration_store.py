@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple, Union
+
+from action.action_registry import action_registry
+from action.window_action import WindowAction
+from config import LogConfig
+from state.impl.action_set_state import ActionSetState
+from state.window_state import WindowState
+
+logger = logging.getLogger(__name__)
+logger.addHandler(LogConfig.get_file_handler())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS actions (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ability_name TEXT,
+    page_path TEXT,
+    location TEXT,
+    info TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS actions_page ON actions (page_path);
+CREATE TABLE IF NOT EXISTS states (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ability_name TEXT,
+    page_path TEXT,
+    actions TEXT,
+    data BLOB,
+    visits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS states_page ON states (page_path);
+CREATE TABLE IF NOT EXISTS transitions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    time REAL NOT NULL,
+    from_state INTEGER,
+    action INTEGER,
+    to_state INTEGER NOT NULL,
+    from_page TEXT,
+    to_page TEXT
+);
+CREATE INDEX IF NOT EXISTS transitions_from ON transitions (from_state);
+CREATE INDEX IF NOT EXISTS transitions_to ON transitions (to_state);
+CREATE INDEX IF NOT EXISTS transitions_action ON transitions (action);
+CREATE TABLE IF NOT EXISTS page_visits (
+    time REAL NOT NULL,
+    ability_name TEXT NOT NULL,
+    page_path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS page_visits_page ON page_visits (page_path);
+CREATE TABLE IF NOT EXISTS coverage (
+    time REAL NOT NULL,
+    statement TEXT,
+    branch TEXT,
+    function TEXT,
+    line TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value BLOB
+);
+"""
+
+
+class ExplorationStore:
+    """
+    The results of a run in one SQLite database: actions, states, transitions, page visits, coverage samples,
+    plus the counters needed to resume. The agent tables are left to the checkpoint.
+
+    Recording only enqueues rows; a writer thread owns the connection (WAL journal) and inserts whatever has
+    queued up in one transaction per batch. A batch that fails is written again row by row, each row retried
+    `retries` times, so only a row that keeps failing is lost. Actions are taken from the action registry by the
+    writer, with their registry ids. States are numbered in the order they are recorded.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, retries: int = 3):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.state_ids: Dict[WindowState, int] = {}
+        self._action_cursor = 0
+        self._queue: "queue.Queue[Union[Tuple[str, tuple], None]]" = queue.Queue()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.commit()
+        self._action_cursor = connection.execute("SELECT COUNT(*) FROM actions").fetchone()[0]
+        connection.close()
+        self._thread = threading.Thread(target=self._run, name="exploration-store")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _put(self, sql: str, params: tuple) -> None:
+        self._queue.put((sql, params))
+
+    def record_state(self, state: WindowState, visits: int = 1) -> int:
+        """Add `visits` to the visits of `state`, inserting it first if it is new. Returns the state id."""
+        state_id = self.state_ids.get(state)
+        if state_id is None:
+            state_id = self.state_ids[state] = len(self.state_ids)
+            if isinstance(state, ActionSetState):
+                row = (state_id, type(state).__name__, state.ability_name, state.page_path,
+                       json.dumps(state.to_dict()["actions"]), None, visits)
+            else:
+                row = (state_id, type(state).__name__, None, None, None, pickle.dumps(state), visits)
+            self._put("INSERT OR REPLACE INTO states VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+        elif visits:
+            self._put("UPDATE states SET visits = visits + ? WHERE id = ?", (visits, state_id))
+        return state_id
+
+    def record_transition(self, prev_state: Union[WindowState, None], action: Union[WindowAction, None],
+                          state: WindowState, from_page: Union[str, None], to_page: Union[str, None]) -> None:
+        self._put("INSERT INTO transitions (time, from_state, action, to_state, from_page, to_page) "
+                  "VALUES (?, ?, ?, ?, ?, ?)",
+                  (time.time(), self.state_ids.get(prev_state) if prev_state is not None else None,
+                   action_registry.id_of(action) if action is not None else None, self.state_ids.get(state),
+                   from_page, to_page))
+
+    def record_page_visit(self, ability_name: str, page_path: str) -> None:
+        self._put("INSERT INTO page_visits VALUES (?, ?, ?)", (time.time(), ability_name, page_path))
+
+    def record_coverage(self, t: float, statement: str, branch: str, function: str, line: str) -> None:
+        self._put("INSERT INTO coverage VALUES (?, ?, ?, ?, ?)", (t, statement, branch, function, line))
+
+    def set_meta(self, key: str, value: Any) -> None:
+        """Store `value` (pickled) under `key`, replacing the previous value."""
+        self._put("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, pickle.dumps(value)))
+
+    def _new_actions(self) -> Tuple[List[tuple], int]:
+        """Rows of the actions registered since the last commit, and the cursor to move to once they are in."""
+        end = len(action_registry)
+        rows = []
+        for action_id in range(self._action_cursor, end):
+            action = action_registry.get(action_id)
+            rows.append((action_id, type(action).__name__, getattr(action, "ability_name", None),
+                         getattr(action, "page_path", getattr(action, "page_name", None)),
+                         getattr(action, "location", None), str(action), pickle.dumps(action)))
+        return rows, end
+
+    def _write(self, connection: sqlite3.Connection, rows: List[Tuple[str, tuple]]) -> None:
+        """Insert the new actions and run `rows` in one transaction."""
+        with connection:
+            # Actions first, the rows below may refer to them.
+            actions, action_cursor = self._new_actions()
+            if actions:
+                connection.executemany("INSERT OR REPLACE INTO actions VALUES (?, ?, ?, ?, ?, ?, ?)", actions)
+            for row in rows:
+                connection.execute(*row)
+        # Rolled back actions are written again with the next transaction.
+        self._action_cursor = action_cursor
+
+    def _write_retrying(self, connection: sqlite3.Connection, row: Tuple[str, tuple]) -> None:
+        for attempt in range(self.retries):
+            try:
+                self._write(connection, [row])
+                return
+            except sqlite3.Error as e:
+                if attempt == self.retries - 1:
+                    logger.error(f"Exploration store dropped {row[0]} {row[1][:2]}: {e}")
+                    return
+                # Typically the database is locked or the disk is full for a moment.
+                time.sleep(self.flush_interval * (attempt + 1))
+
+    def _run(self) -> None:
+        connection = self._connect()
+        stopped = False
+        while not stopped:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [item for item in batch if item is not None]
+            stopped = len(rows) < len(batch)
+            try:
+                self._write(connection, rows)
+            except sqlite3.Error as e:
+                # Write the rows one at a time, in order, so a bad row does not take the rest of the batch with it.
+                logger.warning(f"Exploration store write failed, retrying row by row: {e}")
+                for row in rows:
+                    self._write_retrying(connection, row)
+            for _ in batch:
+                self._queue.task_done()
+        connection.close()
+
+    def flush(self) -> None:
+        """Block until everything recorded so far is committed."""
+        self._queue.join()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def load(self) -> Dict[str, Any]:
+        """
+        Read back a run: the actions in id order, the states by id with their visits, the transitions in order,
+        page visits per (ability, page) and the meta values.
+        """
+        self.flush()
+        connection = self._connect()
+        try:
+            actions = [pickle.loads(data) for (data,) in connection.execute("SELECT data FROM actions ORDER BY id")]
+            states: Dict[int, Tuple[WindowState, int]] = {}
+            rows = connection.execute("SELECT id, kind, ability_name, page_path, actions, data, visits FROM states "
+                                      "ORDER BY id")
+            for state_id, kind, ability_name, page_path, action_ids, data, visits in rows:
+                if kind == ActionSetState.__name__:
+                    state = ActionSetState.from_ids(json.loads(action_ids), ability_name, page_path)
+                else:
+                    state = pickle.loads(data)
+                states[state_id] = (state, visits)
+            transitions = connection.execute("SELECT from_state, action, to_state, from_page, to_page "
+                                             "FROM transitions ORDER BY seq").fetchall()
+            page_visits = connection.execute("SELECT ability_name, page_path, COUNT(*) FROM page_visits "
+                                             "GROUP BY ability_name, page_path").fetchall()
+            meta = {key: pickle.loads(value) for key, value in connection.execute("SELECT key, value FROM meta")}
+        finally:
+            connection.close()
+        return {"actions": actions, "states": states, "transitions": transitions, "page_visits": page_visits,
+                "meta": meta}
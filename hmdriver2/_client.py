@@ -2,6 +2,8 @@
 
 import socket
 import json
+import struct
+import itertools
 import time
 import os
 import typing
@@ -13,11 +15,14 @@ from functools import cached_property
 from . import logger
 from .hdc import HdcWrapper
 from .proto import HypiumResponse, DriverData
-from .exception import InvokeHypiumError, InvokeCaptures
+from .exception import InvokeHypiumError, InvokeCaptures, InvokeNoReplyError
 
 
 UITEST_SERVICE_PORT = 8012
 SOCKET_TIMEOUT = 20
+RECV_SIZE = 65536
+# Upper bound of a length-delimited reply, a larger prefix means the stream is out of sync.
+MAX_FRAME_SIZE = 256 * 1024 * 1024
 
 
 class HmClient:
@@ -25,6 +30,11 @@ class HmClient:
     def __init__(self, serial: str):
         self.hdc = HdcWrapper(serial)
         self.sock = None
+        self._rbuf = bytearray()
+        self._scanned = 0
+        self._decoder = json.JSONDecoder()
+        self._request_seq = itertools.count()
+        self._started = False
 
     @cached_property
     def local_port(self):
@@ -42,6 +52,14 @@ class HmClient:
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.settimeout(SOCKET_TIMEOUT)
         self.sock.connect((("127.0.0.1", self.local_port)))
+        self._rbuf = bytearray()
+        self._scanned = 0
+
+    @staticmethod
+    def _encode_msg(msg: typing.Dict) -> bytes:
+        msg = json.dumps(msg, ensure_ascii=False, separators=(',', ':'))
+        logger.debug(f"sendMsg: {msg}")
+        return msg.encode('utf-8') + b'\n'
 
     def _send_msg(self, msg: typing.Dict):
         """Send an message to the server.
@@ -59,14 +77,12 @@ class HmClient:
                 "client": "127.0.0.1"
             }
         """
-        msg = json.dumps(msg, ensure_ascii=False, separators=(',', ':'))
-        logger.debug(f"sendMsg: {msg}")
-        self.sock.sendall(msg.encode('utf-8') + b'\n')
+        self.sock.sendall(self._encode_msg(msg))
 
     def _recv_msg(self, buff_size: int = 4096, decode=False, print=True) -> typing.Union[bytearray, str]:
+        """Read whatever is available on the socket, used for raw streams such as screen capture frames."""
         full_msg = bytearray()
         try:
-            # FIXME
             relay = self.sock.recv(buff_size)
             if decode:
                 relay = relay.decode()
@@ -81,6 +97,148 @@ class HmClient:
 
         return full_msg
 
+    def _take_frame(self) -> typing.Union[bytes, None]:
+        """Cut one complete reply off the front of the receive buffer, None if it is not complete yet."""
+        buf = self._rbuf
+        # Drop the line terminator left behind by a reply that was complete before its newline arrived.
+        while buf[:1] in (b"\n", b"\r", b" ", b"\t"):
+            del buf[:1]
+        if not buf:
+            return None
+
+        if buf[:1] in (b"{", b"["):
+            index = buf.find(b"\n", self._scanned)
+            if index >= 0:
+                frame = bytes(buf[:index])
+                del buf[:index + 1]
+                self._scanned = 0
+                return frame
+            self._scanned = len(buf)
+            # Older agents do not terminate replies, the reply ends once the buffered JSON is complete.
+            if buf.rstrip().endswith((b"}", b"]")):
+                try:
+                    _, end = self._decoder.raw_decode(buf.decode("utf-8"))
+                except ValueError:
+                    return None
+                size = len(buf.decode("utf-8")[:end].encode("utf-8"))
+                frame = bytes(buf[:size])
+                del buf[:size]
+                self._scanned = 0
+                return frame
+            return None
+
+        # Length-delimited reply: 4-byte big-endian size followed by the payload.
+        if len(buf) < 4:
+            return None
+        (size,) = struct.unpack(">I", buf[:4])
+        if size > MAX_FRAME_SIZE:
+            raise ConnectionError(f"Invalid reply frame: {bytes(buf[:16])!r}")
+        if len(buf) < 4 + size:
+            return None
+        frame = bytes(buf[4:4 + size])
+        del buf[:4 + size]
+        return frame
+
+    def _recv_frame(self) -> bytes:
+        """
+        Read exactly one reply of any size, e.g. a layout capture spanning many packets.
+
+        Replies are either newline-delimited JSON or length-delimited; bytes read past the end of a reply
+        stay buffered for the next one, so pipelined replies are not lost.
+        """
+        while True:
+            frame = self._take_frame()
+            if frame is not None:
+                logger.debug(f"recvMsg: {frame[:1024].decode('utf-8', errors='replace')}")
+                return frame
+            chunk = self.sock.recv(RECV_SIZE)
+            if not chunk:
+                raise ConnectionError("uitest socket closed")
+            self._rbuf += chunk
+
+    def _new_request_id(self) -> str:
+        # Pipelined requests are sent within the same microsecond, the counter keeps their ids apart.
+        return f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}{next(self._request_seq) % 1000:03d}"
+
+    def reset(self):
+        """Drop the connection and whatever is buffered from it, the next request connects again."""
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError as e:
+                logger.debug(f"Error while closing the uitest socket: {e}")
+        self.sock = None
+        self._rbuf = bytearray()
+        self._scanned = 0
+
+    def _ensure_connected(self):
+        """Start the client before the first request and reconnect after a reset."""
+        if self.sock is not None:
+            return
+        try:
+            if self._started:
+                self._connect_sock()
+                self._create_hdriver()
+            else:
+                self.start()
+        except Exception as e:
+            self.reset()
+            raise ConnectionError(f"uitest socket not connected: {e}")
+
+    def _exchange(self, msgs: typing.List[typing.Dict]) -> typing.List[HypiumResponse]:
+        """
+        Send all messages in one write, then read one reply per message.
+
+        Replies are matched to their requests by `request_id` when the server echoes it, otherwise in the
+        order they arrive. If a reply does not come in time or can not be read, the connection is reset, so
+        that a late reply can not be taken for the answer to a later request.
+
+        Raises:
+        ConnectionError: The messages could not be sent.
+        InvokeNoReplyError: The messages were sent but not all replies were received.
+        """
+        self._ensure_connected()
+        try:
+            self.sock.sendall(b"".join(self._encode_msg(msg) for msg in msgs))
+        except OSError as e:
+            self.reset()
+            raise ConnectionError(f"uitest socket send failed: {e}")
+
+        pending = {msg["request_id"]: index for index, msg in enumerate(msgs)}
+        responses: typing.List[typing.Union[HypiumResponse, None]] = [None] * len(msgs)
+        next_index = 0
+        while pending:
+            try:
+                reply = json.loads(self._recv_frame())
+            except (OSError, ValueError) as e:
+                logger.warning(f"No reply for {len(pending)} of {len(msgs)} requests, reset the connection: {e}")
+                self.reset()
+                raise InvokeNoReplyError(str(e))
+            request_id = reply.get("request_id") if isinstance(reply, dict) else None
+            if request_id is not None and request_id not in pending:
+                logger.debug(f"Skip stale reply {request_id}")
+                continue
+            if request_id is None:
+                while responses[next_index] is not None:
+                    next_index += 1
+                request_id = msgs[next_index]["request_id"]
+            index = pending.pop(request_id)
+            responses[index] = HypiumResponse(result=reply.get("result"), exception=reply.get("exception"))
+        return responses
+
+    def _hypium_msg(self, api: str, this: typing.Union[str, None], args: typing.List) -> typing.Dict:
+        return {
+            "module": "com.ohos.devicetest.hypiumApiHelper",
+            "method": "callHypiumApi",
+            "params": {
+                "api": api,
+                "this": this,
+                "args": args,
+                "message_type": "hypium"
+            },
+            "request_id": self._new_request_id()
+        }
+
     def invoke(self, api: str, this: str = "Driver#0", args: typing.List = []) -> HypiumResponse:
         """
         Hypium invokes given API method with the specified arguments and handles exceptions.
@@ -95,67 +253,74 @@ class HmClient:
         Raises:
         InvokeHypiumError: If the API call returns an exception in the response.
         """
+        return self.invoke_many([(api, this, args)])[0]
 
-        request_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        params = {
-            "api": api,
-            "this": this,
-            "args": args,
-            "message_type": "hypium"
-        }
+    def invoke_many(self, calls: typing.List[typing.Tuple[str, typing.Union[str, None], typing.List]]) \
+            -> typing.List[HypiumResponse]:
+        """
+        Pipeline several Hypium calls: send them all at once and wait for all replies, one round trip
+        instead of one per call. The server runs the calls in order.
 
-        msg = {
-            "module": "com.ohos.devicetest.hypiumApiHelper",
-            "method": "callHypiumApi",
-            "params": params,
-            "request_id": request_id
-        }
+        Args:
+        calls (List[Tuple[str, str, List]]): (api, this, args) of each call.
 
-        self._send_msg(msg)
-        raw_data = self._recv_msg(decode=True)
-        data = HypiumResponse(**(json.loads(raw_data)))
-        if data.exception:
-            raise InvokeHypiumError(data.exception)
-        return data
+        Returns:
+        List[HypiumResponse]: The responses, in the order of the calls.
 
-    def invoke_captures(self, api: str, args: typing.List = []) -> HypiumResponse:
-        request_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
-        params = {
-            "api": api,
-            "args": args
-        }
+        Raises:
+        InvokeHypiumError: If any of the calls returns an exception; all replies are read first.
+        """
+        if not calls:
+            return []
+        responses = self._exchange([self._hypium_msg(api, this, args) for api, this, args in calls])
+        for data in responses:
+            if data.exception:
+                raise InvokeHypiumError(data.exception)
+        return responses
 
+    def invoke_captures(self, api: str, args: typing.List = []) -> HypiumResponse:
         msg = {
             "module": "com.ohos.devicetest.hypiumApiHelper",
             "method": "Captures",
-            "params": params,
-            "request_id": request_id
+            "params": {
+                "api": api,
+                "args": args
+            },
+            "request_id": self._new_request_id()
         }
 
-        self._send_msg(msg)
-        raw_data = self._recv_msg(decode=True)
-        data = HypiumResponse(**(json.loads(raw_data)))
+        data = self._exchange([msg])[0]
         if data.exception:
             raise InvokeCaptures(data.exception)
         return data
 
+    def capture_layout(self) -> typing.Dict:
+        """
+        Capture the UI layout over the uitest socket and parse it straight from the receive buffer,
+        without writing it to a file on the device or on the host.
+        """
+        layout = self.invoke_captures("captureLayout").result
+        if isinstance(layout, str):
+            layout = json.loads(layout)
+        return layout
+
     def start(self):
         logger.info("Start HmClient connection")
         self._init_so_resource()
         self._restart_uitest_service()
 
         self._connect_sock()
+        self._started = True
 
         self._create_hdriver()
 
     def release(self):
         logger.info(f"Release {self.__class__.__name__} connection")
         try:
-            if self.sock:
-                self.sock.close()
-                self.sock = None
+            self.reset()
 
             self._rm_local_port()
+            self.hdc.close()
 
         except Exception as e:
             logger.error(f"An error occurred: {e}")
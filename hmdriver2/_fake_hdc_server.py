@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+"""
+A local stand-in for the hdc server, speaking the same channel protocol as HdcServerClient.
+
+The "device" is the local machine: shell commands run in /bin/sh, `file recv` copies local files (or
+serves in-memory ones) and `fport` forwards a local TCP port to another local port. It lets the protocol
+layer be tested and benchmarked without a device:
+
+    python -m hmdriver2._fake_hdc_server
+"""
+
+import shutil
+import socket
+import socketserver
+import struct
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Union
+
+from ._hdc_native import HANDSHAKE_BANNER, BANNER_SIZE, CONNECT_KEY_SIZE, _send_packet, _recv_packet
+
+ShellHandler = Callable[[str], str]
+
+
+def _run_local_shell(cmd: str) -> str:
+    result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+class _Forward:
+    def __init__(self, lport: int, rport: int):
+        self.lport, self.rport = lport, rport
+        self.listener = socket.create_server(("127.0.0.1", lport))
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.listener.accept()
+                upstream = socket.create_connection(("127.0.0.1", self.rport))
+            except OSError:
+                return
+            for src, dst in ((client, upstream), (upstream, client)):
+                pipe = threading.Thread(target=self._pipe, args=(src, dst))
+                pipe.daemon = True
+                pipe.start()
+
+    @staticmethod
+    def _pipe(src: socket.socket, dst: socket.socket):
+        try:
+            while True:
+                data = src.recv(65536)
+                if not data:
+                    break
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            for s in (src, dst):
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def close(self):
+        self.listener.close()
+
+
+class FakeHdcServer:
+    def __init__(self, targets: Union[List[str], None] = None, port: int = 0,
+                 shell_handler: ShellHandler = _run_local_shell, files: Union[Dict[str, bytes], None] = None):
+        """
+        Args:
+            targets (List[str]): Serial numbers reported by `list targets`.
+            port (int): Port to listen on, 0 picks a free one.
+            shell_handler (Callable[[str], str]): Produces the output of a shell command.
+            files (Dict[str, bytes]): Remote files served by `file recv`, other paths are read from local disk.
+        """
+        self.targets = targets if targets is not None else ["127.0.0.1:5555"]
+        self.shell_handler = shell_handler
+        self.files = files if files is not None else {}
+        self.forwards: Dict[str, _Forward] = {}
+        self.commands: List[str] = []
+        # Channels that are handshaken and waiting for their command.
+        self._idle: List[socket.socket] = []
+        self._lock = threading.Lock()
+        server = self
+
+        class _Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server._handle(self.request)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._channel_id = 0
+
+    def start(self) -> 'FakeHdcServer':
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        for forward in self.forwards.values():
+            forward.close()
+
+    def __enter__(self) -> 'FakeHdcServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _handle(self, sock: socket.socket):
+        self._channel_id += 1
+        _send_packet(sock, HANDSHAKE_BANNER.ljust(BANNER_SIZE, b"\0") +
+                     struct.pack(">I", self._channel_id).ljust(CONNECT_KEY_SIZE, b"\0"))
+        handshake = _recv_packet(sock)
+        if not handshake or not handshake.startswith(HANDSHAKE_BANNER):
+            return
+        connect_key = handshake[BANNER_SIZE:BANNER_SIZE + CONNECT_KEY_SIZE].rstrip(b"\0").decode("utf-8")
+        with self._lock:
+            self._idle.append(sock)
+        try:
+            packet = _recv_packet(sock)
+        except OSError:
+            packet = None
+        with self._lock:
+            if sock not in self._idle:
+                return
+            self._idle.remove(sock)
+        if packet is None:
+            return
+        command = packet.rstrip(b"\0").decode("utf-8")
+        self.commands.append(command)
+        output = self._dispatch(connect_key, command)
+        if output:
+            _send_packet(sock, output.encode("utf-8"))
+        sock.close()
+
+    def drop_idle(self) -> int:
+        """Close the channels waiting for a command, as the real server does with idle channels. Returns their number."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock in idle:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        return len(idle)
+
+    def _dispatch(self, connect_key: str, command: str) -> str:
+        if command == "list targets":
+            return "\n".join(self.targets) + "\n" if self.targets else "[Empty]\n"
+        if connect_key and connect_key not in self.targets:
+            return f"[Fail]Device not found or connected: {connect_key}\n"
+        if command.startswith("shell "):
+            return self.shell_handler(command[len("shell "):])
+        if command.startswith("file recv "):
+            return self._file_recv(*command[len("file recv "):].split(" ", 1))
+        if command.startswith("fport"):
+            return self._fport(connect_key, command.split()[1:])
+        return f"[Fail]Unknown command: {command}\n"
+
+    def _file_recv(self, rpath: str, lpath: str) -> str:
+        start = time.time()
+        try:
+            if rpath in self.files:
+                with open(lpath, "wb") as f:
+                    f.write(self.files[rpath])
+            else:
+                shutil.copyfile(rpath, lpath)
+        except OSError as e:
+            return f"[Fail]Error opening file: {e}\n"
+        return f"FileTransfer finish, File count = 1, time:{int((time.time() - start) * 1000)}ms\n"
+
+    def _fport(self, connect_key: str, args: List[str]) -> str:
+        if args == ["ls"]:
+            if not self.forwards:
+                return "[Empty]\n"
+            return "".join(f"{connect_key}    {rule}    [Forward]\n" for rule in self.forwards)
+        if args and args[0] == "rm":
+            rule = " ".join(args[1:])
+            forward = self.forwards.pop(rule, None)
+            if forward is None:
+                return f"[Fail]Remove forward ruler failed, ruler is not exist {rule}\n"
+            forward.close()
+            return f"Remove forward ruler success, ruler:{rule}\n"
+        if len(args) == 2 and all(arg.startswith("tcp:") for arg in args):
+            rule = " ".join(args)
+            try:
+                self.forwards[rule] = _Forward(int(args[0][4:]), int(args[1][4:]))
+            except OSError as e:
+                return f"[Fail]Forward port failed: {e}\n"
+            return "Forwardport result:OK\n"
+        return f"[Fail]Incorrect forward command: {' '.join(args)}\n"
+
+
+if __name__ == "__main__":
+    import logging
+    from ._hdc_native import HdcServerClient
+
+    logging.getLogger('hmtest').setLevel(logging.INFO)
+
+    rounds = 200
+    with FakeHdcServer() as fake:
+        client = HdcServerClient(port=fake.port)
+        serial = fake.targets[0]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            client.shell(serial, "echo ok")
+        elapsed = time.perf_counter() - start
+        print(f"native shell round trip: {elapsed / rounds * 1000:.3f} ms over {rounds} commands")
+        client.close()
@@ -96,6 +96,7 @@ class _Gesture:
         Execute the gesture action.
         """
         logger.info(f">>>Gesture steps: {self.steps}")
+        self.d._invalidate_observation()
         total_points = self._calculate_total_points()
 
         pointer_matrix = self._create_pointer_matrix(total_points)
@@ -178,9 +179,10 @@ class _Gesture:
             """
             if interval is not None:
                 point.x += 65536 * interval
-            api = "PointerMatrix.setPoint"
-            self.d._client.invoke(api, this=pointer_matrix, args=[0, point_index, point.to_dict()])
+            calls.append(("PointerMatrix.setPoint", pointer_matrix, [0, point_index, point.to_dict()]))
 
+        # The points are collected first and sent in one pipelined batch instead of one round trip each.
+        calls = []
         point_index = 0
 
         for index, step in enumerate(self.steps):
@@ -196,6 +198,8 @@ class _Gesture:
             set_point(point_index, Point(*step.pos))
             point_index += 1
 
+        self.d._client.invoke_many(calls)
+
     def _generate_start_point(self, step, point_index, set_point):
         """
         Generate start points.
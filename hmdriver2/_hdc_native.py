@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Tuple, Union
+
+from . import logger
+from .proto import CommandResult
+from .exception import HdcError
+
+HDC_SERVER_HOST = "127.0.0.1"
+HDC_SERVER_PORT = int(os.getenv("OHOS_HDC_SERVER_PORT", 8710))
+HANDSHAKE_BANNER = b"OHOS HDC"
+BANNER_SIZE = 12
+CONNECT_KEY_SIZE = 32
+CONNECT_TIMEOUT = 3
+RETRY_INTERVAL = 30
+POOL_SIZE = 2
+
+
+def _send_packet(sock: socket.socket, payload: bytes):
+    sock.sendall(struct.pack(">I", len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("hdc channel closed")
+        buf += chunk
+    return bytes(buf)
+
+
+class _NoReply(ConnectionError):
+    """The channel failed before any reply byte arrived; `closed` if the server closed it without an error."""
+
+    def __init__(self, message: str, closed: bool = False):
+        super().__init__(message)
+        self.closed = closed
+
+
+def _recv_packet(sock: socket.socket) -> Union[bytes, None]:
+    """Read one length-prefixed packet, None once the server has closed the channel."""
+    try:
+        header = _recv_exact(sock, 4)
+    except ConnectionError:
+        return None
+    (size,) = struct.unpack(">I", header)
+    return _recv_exact(sock, size)
+
+
+class _Channel:
+    """
+    One client channel to the hdc server.
+
+    The server greets with a handshake packet (banner + channel id); the client answers with the banner
+    and the connect key of the target it wants to talk to, then sends a single command and reads the
+    output packets until the server closes the channel.
+    """
+
+    def __init__(self, connect_key: str, host: str, port: int):
+        self.sock = socket.create_connection((host, port), timeout=CONNECT_TIMEOUT)
+        greeting = _recv_packet(self.sock)
+        if not greeting or not greeting.startswith(HANDSHAKE_BANNER):
+            self.close()
+            raise ConnectionError("unexpected hdc server handshake")
+        key = connect_key.encode("utf-8")[:CONNECT_KEY_SIZE].ljust(CONNECT_KEY_SIZE, b"\0")
+        reply = HANDSHAKE_BANNER.ljust(BANNER_SIZE, b"\0") + key
+        # Newer servers append a version field to the handshake, answer with a packet of the same size.
+        reply = reply.ljust(len(greeting), b"\0")
+        _send_packet(self.sock, reply)
+
+    def execute(self, command: str, timeout: Union[float, None]) -> str:
+        """
+        Send `command` and read its output.
+
+        Raises _NoReply if the command could not be written, or the channel failed or was closed before the
+        first byte of a reply. Any later failure leaves the command run, it raises the plain OSError.
+        """
+        self.sock.settimeout(timeout)
+        try:
+            _send_packet(self.sock, command.encode("utf-8") + b"\0")
+        except socket.timeout:
+            self.close()
+            raise
+        except OSError as e:
+            self.close()
+            raise _NoReply(f"hdc command not sent: {e}")
+        try:
+            first = self.sock.recv(1, socket.MSG_PEEK)
+        except socket.timeout:
+            self.close()
+            raise
+        except OSError as e:
+            self.close()
+            raise _NoReply(f"hdc channel failed before replying: {e}")
+        if not first:
+            self.close()
+            raise _NoReply("hdc channel closed before replying", closed=True)
+        output = bytearray()
+        try:
+            while True:
+                packet = _recv_packet(self.sock)
+                if packet is None:
+                    break
+                output += packet
+        finally:
+            self.close()
+        return output.decode("utf-8", errors="replace")
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class HdcServerClient:
+    """
+    Talks to the local hdc server over its socket, without launching the `hdc` CLI.
+
+    Channels are single use on the server side, so the client keeps a small pool of channels that have
+    already been connected and handshaken for each target, refilled in the background.
+    """
+    _END = "__HMTEST_END__"
+
+    def __init__(self, host: str = HDC_SERVER_HOST, port: int = HDC_SERVER_PORT, pool_size: int = POOL_SIZE):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self._pool: Dict[str, List[_Channel]] = {}
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+
+    @property
+    def usable(self) -> bool:
+        return time.monotonic() >= self._retry_at
+
+    def _open(self, connect_key: str) -> _Channel:
+        try:
+            return _Channel(connect_key, self.host, self.port)
+        except OSError as e:
+            # Typically the server is not started yet; the CLI fallback starts it, try again later.
+            self._retry_at = time.monotonic() + RETRY_INTERVAL
+            raise HdcError("HDC server unreachable", f"{self.host}:{self.port} {e}")
+
+    def _refill(self, connect_key: str):
+        try:
+            channel = _Channel(connect_key, self.host, self.port)
+        except OSError:
+            return
+        with self._lock:
+            idle = self._pool.setdefault(connect_key, [])
+            if len(idle) < self.pool_size:
+                idle.append(channel)
+                return
+        channel.close()
+
+    def _acquire(self, connect_key: str) -> Tuple[_Channel, bool]:
+        with self._lock:
+            idle = self._pool.get(connect_key)
+            channel = idle.pop() if idle else None
+        if self.pool_size > 0 and not sys.is_finalizing():
+            refill = threading.Thread(target=self._refill, args=(connect_key,))
+            refill.daemon = True
+            refill.start()
+        if channel is not None:
+            return channel, True
+        return self._open(connect_key), False
+
+    def command(self, command: str, connect_key: str = "", timeout: Union[float, None] = None) -> str:
+        """Run an hdc command (e.g. `fport ls`, `file recv a b`) for the target and return its output."""
+        logger.debug(f"hdc -t {connect_key} {command} (native)")
+        channel, pooled = self._acquire(connect_key)
+        try:
+            return self._execute(channel, command, timeout)
+        except _NoReply as e:
+            if not pooled:
+                return self._no_reply(e)
+            # An idle pooled channel may have been dropped by the server before it read the command, retry
+            # once on a fresh one. Once any reply has arrived the command has run, and it is never repeated.
+            logger.debug(f"Pooled hdc channel dropped, retrying on a new one: {e}")
+        try:
+            return self._execute(self._open(connect_key), command, timeout)
+        except _NoReply as e:
+            return self._no_reply(e)
+
+    @staticmethod
+    def _execute(channel: _Channel, command: str, timeout: Union[float, None]) -> str:
+        try:
+            return channel.execute(command, timeout)
+        except socket.timeout:
+            raise TimeoutError(f"hdc command timed out after {timeout}s: {command}")
+        except _NoReply:
+            raise
+        except OSError as e:
+            raise HdcError("HDC server error", str(e))
+
+    @staticmethod
+    def _no_reply(e: _NoReply) -> str:
+        # A fresh channel that was closed without a reply ran a command with no output.
+        if e.closed:
+            return ""
+        raise HdcError("HDC server error", str(e))
+
+    def shell(self, connect_key: str, cmd: str, timeout: Union[float, None] = None) -> CommandResult:
+        """Run a shell command on the target; the exit code is appended by the device shell."""
+        token = uuid.uuid4().hex
+        end = f"{self._END}{token}:"
+        output = self.command(f"shell {{ {cmd}\n}}; printf '%s%s:%d' '{self._END}' '{token}' $?",
+                              connect_key, timeout)
+        index = output.rfind(end)
+        if index < 0:
+            return CommandResult("", output, -1)
+        exit_code = output[index + len(end):].strip()
+        output = output[:index]
+        if output.lower().__contains__('error:'):
+            return CommandResult("", output, -1)
+        return CommandResult(output, "", int(exit_code) if exit_code.lstrip("-").isdigit() else -1)
+
+    def list_targets(self) -> List[str]:
+        output = self.command("list targets")
+        return [line.strip() for line in output.splitlines() if line.strip() and 'Empty' not in line]
+
+    def close(self):
+        with self._lock:
+            for idle in self._pool.values():
+                for channel in idle:
+                    channel.close()
+            self._pool.clear()
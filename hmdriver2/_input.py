@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+import shlex
+from typing import Callable, List, Sequence, Union, TYPE_CHECKING
+
+from . import logger
+from ._uiobject import UiObject
+from .exception import HdcError, InvokeHypiumError, InvokeNoReplyError
+from .proto import KeyCode
+
+if TYPE_CHECKING:
+    from .driver import Driver
+
+
+class _InputInjector:
+    """
+    Sends taps, key events, text and swipes as Hypium calls over the uitest socket the driver already holds open,
+    one socket round trip per input instead of a `uitest uiInput` process started on the device. A sequence of
+    keys is pipelined, so it costs a single round trip.
+
+    If a call could not be sent, or the agent answered it with an error, the input is sent with the equivalent
+    `uitest uiInput` shell command instead. If a call was sent but not answered, the agent may have carried it
+    out, so it is not repeated. The same goes for a batch that failed part way. After `max_failures` failures in
+    a row the socket is no longer tried.
+    """
+
+    def __init__(self, d: 'Driver', max_failures: int = 3):
+        """
+        Args:
+            d (Driver): The driver whose uitest socket and shell are used.
+            max_failures (int): Consecutive socket failures after which only shell commands are used.
+        """
+        self.d = d
+        self.max_failures = max_failures
+        self.use_socket = True
+        self._failures = 0
+
+    def _socket_failed(self, e: Exception, fallback: str) -> None:
+        self._failures += 1
+        if self._failures >= self.max_failures:
+            self.use_socket = False
+            logger.warning(f"Input over the uitest socket failed {self._failures} times, using shell from now on: {e}")
+        else:
+            logger.warning(f"Input over the uitest socket failed, {fallback}: {e}")
+
+    def _inject(self, socket_call: Callable[[], object], shell_cmds: Union[str, List[str]],
+                batch: bool = False) -> None:
+        """Run `socket_call`, or the shell command(s) `shell_cmds` one by one if the socket can not be used."""
+        if self.use_socket:
+            try:
+                socket_call()
+                self._failures = 0
+                return
+            except InvokeNoReplyError as e:
+                self._socket_failed(e, "not repeated")
+                return
+            except InvokeHypiumError as e:
+                if batch:
+                    # Calls of the batch before the failed one have been carried out.
+                    self._socket_failed(e, "not repeated")
+                    return
+                self._socket_failed(e, "using shell")
+            except ConnectionError as e:
+                self._socket_failed(e, "using shell")
+        # One command per call: the last fallback hands them to a host shell, which would split `a; b`.
+        for shell_cmd in [shell_cmds] if isinstance(shell_cmds, str) else shell_cmds:
+            self.d.hdc.shell(shell_cmd)
+
+    @staticmethod
+    def _key_value(key_code: Union[KeyCode, int]) -> int:
+        value = key_code.value if isinstance(key_code, KeyCode) else key_code
+        if value > 3200:
+            raise HdcError("Invalid HDC keycode")
+        return value
+
+    def tap(self, x: int, y: int) -> None:
+        self._inject(lambda: self.d._invoke("Driver.click", args=[x, y]), f"uitest uiInput click {x} {y}")
+
+    def key(self, key_code: Union[KeyCode, int]) -> None:
+        value = self._key_value(key_code)
+        self._inject(lambda: self.d._invoke("Driver.triggerKey", args=[value]), f"uitest uiInput keyEvent {value}")
+
+    def keys(self, key_codes: Sequence[Union[KeyCode, int]]) -> None:
+        """Press `key_codes` one after the other, in one round trip."""
+        values: List[int] = [self._key_value(key_code) for key_code in key_codes]
+        if not values:
+            return
+        calls = [("Driver.triggerKey", "Driver#0", [value]) for value in values]
+        self._inject(lambda: self.d._client.invoke_many(calls),
+                     [f"uitest uiInput keyEvent {value}" for value in values], batch=True)
+
+    def text(self, text: str, x: int = 1, y: int = 1) -> None:
+        """Type `text` into the focused field (the shell fallback taps `x`, `y` first)."""
+        self._inject(lambda: self.d._invoke("Driver.inputText", args=[{"x": x, "y": y}, text]),
+                     f"uitest uiInput inputText {x} {y} {shlex.quote(text)}")
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, speed: int = 2000) -> None:
+        self._inject(lambda: self.d._invoke("Driver.swipe", args=[x1, y1, x2, y2, speed]),
+                     f"uitest uiInput swipe {x1} {y1} {x2} {y2} {speed}")
+
+    def enter_text(self, text: str, clear_length: int = 0, submit: bool = True) -> bool:
+        """
+        Replace the text of the focused input field with `text`, then press ENTER if `submit`.
+
+        The field is looked up once; clearing it, typing, reading its text back and ENTER then go out as one
+        pipelined batch. Without a focused field, or if the socket can not be used, `clear_length` DEL presses,
+        the text and ENTER are sent as key events and text input instead. A batch that was sent is never repeated.
+
+        Returns:
+            bool: Whether the field was found and holds `text` afterwards.
+        """
+        if self.use_socket:
+            try:
+                components = UiObject(self.d._client, focused=True).find_components()
+            except (InvokeHypiumError, InvokeNoReplyError, ConnectionError) as e:
+                self._socket_failed(e, "using key events")
+                components = None
+            if components:
+                component = components[-1].value
+                calls = [("Component.clearText", component, []),
+                         ("Component.inputText", component, [text]),
+                         ("Component.getText", component, [])]
+                if submit:
+                    calls.append(("Driver.triggerKey", "Driver#0", [KeyCode.ENTER.value]))
+                try:
+                    responses = self.d._client.invoke_many(calls)
+                except (InvokeHypiumError, InvokeNoReplyError) as e:
+                    self._socket_failed(e, "not repeated")
+                    return False
+                except ConnectionError as e:
+                    self._socket_failed(e, "using key events")
+                else:
+                    self._failures = 0
+                    entered = responses[2].result == text
+                    if not entered:
+                        logger.debug(f"Text field holds {responses[2].result!r} after entering {text!r}")
+                    return entered
+        self.keys([KeyCode.DEL] * clear_length)
+        self.text(text)
+        if submit:
+            self.key(KeyCode.ENTER)
+        return False
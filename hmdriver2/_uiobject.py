@@ -116,11 +116,9 @@ class UiObject:
         return components
 
     def __get_by(self) -> ByData:
-        for k, v in self._kwargs.items():
-            api = f"On.{k}"
-            this = "On#seed"
-            resp: HypiumResponse = self._client.invoke(api, this, args=[v])
-            this = resp.result
+        # Every selector is applied to On#seed, so they do not depend on each other and go out in one batch.
+        calls = [(f"On.{k}", "On#seed", [v]) for k, v in self._kwargs.items()]
+        resp: HypiumResponse = self._client.invoke_many(calls)[-1]
 
         if self._isBefore:
             resp: HypiumResponse = self._client.invoke("On.isBefore", this="On#seed", args=[resp.result])
@@ -130,14 +128,23 @@ class UiObject:
 
         return ByData(resp.result)
 
-    def __operate(self, api, args=[], retries: int = 2):
+    def __ensure_component(self, retries: int = 2):
         if not self._component:
             if not self.find_component(retries):
                 raise ElementNotFoundError(f"Element({self}) not found after {retries} retries")
 
+    def __operate(self, api, args=[], retries: int = 2):
+        self.__ensure_component(retries)
+
         resp: HypiumResponse = self._client.invoke(api, this=self._component.value, args=args)
         return resp.result
 
+    def __operate_many(self, apis: List[str], retries: int = 2) -> List:
+        self.__ensure_component(retries)
+
+        calls = [(api, self._component.value, []) for api in apis]
+        return [resp.result for resp in self._client.invoke_many(calls)]
+
     @property
     def id(self) -> str:
         return self.__operate("Component.getId")
@@ -202,22 +209,39 @@ class UiObject:
 
     @property
     def info(self) -> ElementInfo:
+        (id_, type_, text, description, isSelected, isChecked, isEnabled, isFocused, isCheckable, isClickable,
+         isLongClickable, isScrollable, bounds, boundsCenter) = self.__operate_many([
+            "Component.getId",
+            "Component.getType",
+            "Component.getText",
+            "Component.getDescription",
+            "Component.isSelected",
+            "Component.isChecked",
+            "Component.isEnabled",
+            "Component.isFocused",
+            "Component.isCheckable",
+            "Component.isClickable",
+            "Component.isLongClickable",
+            "Component.isScrollable",
+            "Component.getBounds",
+            "Component.getBoundsCenter",
+        ])
         return ElementInfo(
-            id=self.id,
-            key=self.key,
-            type=self.type,
-            text=self.text,
-            description=self.description,
-            isSelected=self.isSelected,
-            isChecked=self.isChecked,
-            isEnabled=self.isEnabled,
-            isFocused=self.isFocused,
-            isCheckable=self.isCheckable,
-            isClickable=self.isClickable,
-            isLongClickable=self.isLongClickable,
-            isScrollable=self.isScrollable,
-            bounds=self.bounds,
-            boundsCenter=self.boundsCenter)
+            id=id_,
+            key=id_,
+            type=type_,
+            text=text,
+            description=description,
+            isSelected=isSelected,
+            isChecked=isChecked,
+            isEnabled=isEnabled,
+            isFocused=isFocused,
+            isCheckable=isCheckable,
+            isClickable=isClickable,
+            isLongClickable=isLongClickable,
+            isScrollable=isScrollable,
+            bounds=Bounds(**bounds),
+            boundsCenter=Point(**boundsCenter))
 
     @delay
     def click(self):
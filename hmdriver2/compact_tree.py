@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+import re
+from functools import cached_property
+from typing import Dict, List, Any, Iterator, Tuple, Union
+
+import numpy as np
+
+_BOUNDS_RE = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+
+class CompactTree:
+    """
+    The UI hierarchy flattened into parallel arrays, built in one pass over the layout dump.
+
+    Nodes are numbered in pre-order (the root is 0). For each node the tree keeps its parent, the end of its
+    subtree (children of `i` are `i + 1`, then `end[j]` of the previous child, up to `end[i]`), its type id,
+    its bounds as an int32 row and its attributes as interned key/value ids (`attr_keys`/`attr_values`, the
+    slice `attr_offsets[i]:attr_offsets[i + 1]`). Lookups by id, type and clickable are prebuilt indexes;
+    the absolute positional xpath the action detector generates (`//root[1]/Column[1]/Button[2]`) is kept as
+    one interned `Type[k]` step per node and indexed on first lookup.
+    """
+
+    WINDOW_SCENE = "WindowScene"
+
+    def __init__(self, hierarchy: Union[Dict, None]):
+        self.types: List[str] = []
+        self.strings: List[Any] = []
+        self._type_ids: Dict[str, int] = {}
+        self._string_ids: Dict[Any, int] = {}
+
+        parent: List[int] = []
+        end: List[int] = []
+        type_ids: List[int] = []
+        bounds: List[Tuple[int, int, int, int]] = []
+        clickable: List[bool] = []
+        detectable: List[bool] = []
+        steps: List[int] = []
+        attr_offsets: List[int] = [0]
+        attr_keys: List[int] = []
+        attr_values: List[int] = []
+
+        # (node, parent index, xpath step, detectable), children are pushed in reverse to be visited in order.
+        stack = [(hierarchy, -1, "", True)] if hierarchy else []
+        open_nodes: List[int] = []
+        while stack:
+            node, parent_index, step, reachable = stack.pop()
+            index = len(parent)
+            while open_nodes and open_nodes[-1] != parent_index:
+                end[open_nodes.pop()] = index
+
+            attributes = node.get("attributes", {})
+            node_type = attributes.get("type", "")
+            parent.append(parent_index)
+            end.append(index + 1)
+            type_ids.append(self._intern_type(node_type))
+            bounds.append(_parse_bounds(attributes.get("bounds", "")))
+            clickable.append(attributes.get("clickable") == "true")
+            detectable.append(reachable)
+            steps.append(self._intern(step))
+            for key, value in attributes.items():
+                attr_keys.append(self._intern(key))
+                attr_values.append(self._intern(value))
+            attr_offsets.append(len(attr_keys))
+            open_nodes.append(index)
+
+            # The action detector stops at the first WindowScene child, the rest of the siblings are not detected.
+            children = node.get("children", [])
+            counts: Dict[str, int] = {}
+            pending = []
+            child_reachable = reachable
+            for child in children:
+                child_type = child.get("attributes", {}).get("type", "")
+                if child_type == self.WINDOW_SCENE:
+                    child_reachable = False
+                counts[child_type] = counts.get(child_type, 0) + 1
+                pending.append((child, index, f"{child_type}[{counts[child_type]}]", child_reachable))
+            stack.extend(reversed(pending))
+        size = len(parent)
+        for index in open_nodes:
+            end[index] = size
+
+        self.parent = np.array(parent, dtype=np.int32)
+        self.end = np.array(end, dtype=np.int32)
+        self.type_id = np.array(type_ids, dtype=np.int32)
+        self.bounds = np.array(bounds, dtype=np.int32).reshape(-1, 4)
+        self.clickable = np.array(clickable, dtype=bool)
+        self.detectable = np.array(detectable, dtype=bool)
+        self.step = np.array(steps, dtype=np.int32)
+        self.attr_offsets = np.array(attr_offsets, dtype=np.int32)
+        self.attr_keys = np.array(attr_keys, dtype=np.int32)
+        self.attr_values = np.array(attr_values, dtype=np.int32)
+
+        self.by_type: Dict[str, List[int]] = {}
+        for index, type_id in enumerate(type_ids):
+            self.by_type.setdefault(self.types[type_id], []).append(index)
+        self.by_id: Dict[str, List[int]] = {}
+        id_key = self._string_ids.get("id")
+        if id_key is not None:
+            positions = np.flatnonzero(self.attr_keys == id_key)
+            owners = np.searchsorted(self.attr_offsets, positions, side="right") - 1
+            for position, index in zip(positions, owners):
+                self.by_id.setdefault(self.strings[self.attr_values[position]], []).append(int(index))
+        self.clickable_nodes = np.flatnonzero(self.clickable)
+
+    def _intern(self, value: Any) -> int:
+        ids = self._string_ids
+        if type(value) is str:
+            index = ids.get(value)
+            if index is None:
+                index = ids[value] = len(self.strings)
+                self.strings.append(value)
+            return index
+        # Keep True, 1 and 1.0 apart, they are equal as dict keys.
+        key = (type(value), value)
+        try:
+            index = ids.get(key)
+        except TypeError:
+            # Unhashable values (not expected in layout dumps) are stored unshared.
+            self.strings.append(value)
+            return len(self.strings) - 1
+        if index is None:
+            index = ids[key] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def _intern_type(self, node_type: str) -> int:
+        index = self._type_ids.get(node_type)
+        if index is None:
+            index = self._type_ids[node_type] = len(self.types)
+            self.types.append(node_type)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def type_of(self, index: int) -> str:
+        return self.types[self.type_id[index]]
+
+    def attribute(self, index: int, key: str, default: Any = None) -> Any:
+        key_id = self._string_ids.get(key)
+        if key_id is not None:
+            start, stop = self.attr_offsets[index], self.attr_offsets[index + 1]
+            for position in range(start, stop):
+                if self.attr_keys[position] == key_id:
+                    return self.strings[self.attr_values[position]]
+        return default
+
+    def attributes_of(self, index: int) -> Dict[str, Any]:
+        start, stop = self.attr_offsets[index], self.attr_offsets[index + 1]
+        strings = self.strings
+        return {strings[k]: strings[v] for k, v in zip(self.attr_keys[start:stop].tolist(),
+                                                        self.attr_values[start:stop].tolist())}
+
+    def xpath(self, index: int) -> str:
+        """The absolute positional xpath of a node, "/" for the root."""
+        steps = []
+        while index > 0:
+            steps.append(self.strings[self.step[index]])
+            index = self.parent[index]
+        if not steps:
+            return "/"
+        return "//" + "/".join(reversed(steps))
+
+    @cached_property
+    def by_xpath(self) -> Dict[str, int]:
+        return {self.xpath(index): index for index in range(len(self))}
+
+    def children_of(self, index: int) -> Iterator[int]:
+        child = index + 1
+        end = self.end[index]
+        while child < end:
+            yield child
+            child = int(self.end[child])
+
+    def center(self, index: int) -> Tuple[int, int]:
+        left, top, right, bottom = self.bounds[index]
+        return int((left + right) / 2), int((top + bottom) / 2)
+
+    def centers(self, indexes: np.ndarray) -> np.ndarray:
+        """Centers of the given nodes as an (n, 2) array, rounded like `Bounds.get_center`."""
+        b = self.bounds[indexes]
+        return np.stack([(b[:, 0] + b[:, 2]) / 2, (b[:, 1] + b[:, 3]) / 2], axis=1).astype(np.int32)
+
+    def find_by_xpath(self, xpath: str) -> Union[int, None]:
+        return self.by_xpath.get(xpath)
+
+    def find_by_id(self, element_id: str) -> List[int]:
+        return self.by_id.get(element_id, [])
+
+    def find_by_type(self, node_type: str) -> List[int]:
+        return self.by_type.get(node_type, [])
+
+    def detectable_clickable(self) -> np.ndarray:
+        """Clickable nodes the action detector reaches, in pre-order."""
+        return np.flatnonzero(self.clickable & self.detectable)
+
+    def to_dict(self, index: int = 0) -> Dict:
+        """Rebuild the nested `{"attributes": ..., "children": [...]}` hierarchy rooted at `index`."""
+        if not len(self):
+            return {}
+        nodes = {index: {"attributes": self.attributes_of(index), "children": []}}
+        for child in range(index + 1, int(self.end[index])):
+            node = {"attributes": self.attributes_of(child), "children": []}
+            nodes[child] = node
+            nodes[int(self.parent[child])]["children"].append(node)
+        return nodes[index]
+
+
+def _parse_bounds(raw: Any) -> Tuple[int, int, int, int]:
+    result = _BOUNDS_RE.match(raw) if isinstance(raw, str) else None
+    if result:
+        return tuple(int(g) for g in result.groups())
+    return 0, 0, 0, 0
@@ -11,6 +11,8 @@ from . import logger
 from .utils import delay, parse_bounds
 from ._client import HmClient
 from ._uiobject import UiObject
+from .observation import Observation
+from .exception import InvokeCaptures, InvokeHypiumError, InvokeNoReplyError
 from .proto import HypiumResponse, KeyCode, Point, DisplayRotation, DeviceInfo, CommandResult, ComponentData
 
 
@@ -21,6 +23,7 @@ class Driver:
         self.serial = serial
         self._client = HmClient(self.serial)
         self.hdc = self._client.hdc
+        self._layout_over_socket = True
 
         # self._init_hmclient()
 
@@ -48,19 +51,43 @@ class Driver:
 
     @delay
     def start_app(self, package_name: str, page_name: str = "EntryAbility"):
+        self._invalidate_observation()
         self.hdc.start_app(package_name, page_name)
 
+    def start_ability(self, package_name: str, ability_name: str, uri: Union[str, None] = None,
+                      params: Union[Dict, None] = None) -> bool:
+        """
+        Start an ability with a want, e.g. to open a page of the app through a deep link.
+
+        Args:
+            package_name (str): The bundle name of the application.
+            ability_name (str): The ability to start.
+            uri (str, optional): The URI of the want.
+            params (Dict, optional): Parameters of the want.
+
+        Returns:
+            bool: Whether `aa start` accepted the want.
+        """
+        self._invalidate_observation()
+        result = self.hdc.start_ability(package_name, ability_name, uri, params)
+        if result.exit_code != 0 or "error" in result.output.lower():
+            logger.warning(f"Start ability failed: {result.output.strip()} {result.error}")
+            return False
+        return True
+
     def force_start_app(self, package_name: str, page_name: str = "EntryAbility"):
         self.go_home()
         self.stop_app(package_name)
         self.start_app(package_name, page_name)
 
     def stop_app(self, package_name: str):
+        self._invalidate_observation()
         self.hdc.stop_app(package_name)
 
     @delay
     def force_stop_app(self):
         # self.hdc.stop_app(package_name)
+        self._invalidate_observation()
         self.go_home()
 
         if self.hdc.is_emulator():
@@ -70,10 +97,25 @@ class Driver:
         self.hdc.swipe(600, 2000, 600, 1000, 5000)
         # self.hdc.tap(600, 2400)
 
+    def restart_app(self, package_name: str, page_name: str = "EntryAbility", warm: Union[bool, None] = None):
+        """
+        Restart the application and wait until its ability is in the foreground, see `Restarter`.
+
+        Args:
+            package_name (str): The bundle name of the application.
+            page_name (str): The ability to start.
+            warm (bool, optional): Only pop the navigation stack when possible. Defaults to the configured mode.
+
+        Returns:
+            Observation: The first observation of the restarted application.
+        """
+        return self.restarter.restart(package_name, page_name, warm)
+
     def clear_app(self, package_name: str):
         """
         Clear the application's cache and data.
         """
+        self._invalidate_observation()
         self.hdc.shell(f"bm clean -n {package_name} -c")  # clear cache
         self.hdc.shell(f"bm clean -n {package_name} -d")  # clear data
 
@@ -100,19 +142,40 @@ class Driver:
 
         return self.hdc.current_app()
 
-    def get_app_info(self, package_name: str) -> Dict:
+    def foreground_app(self) -> Tuple[str, str]:
+        """
+        Get the foreground application from the window node of the current observation, without another shell
+        command. Falls back to `current_app` (`aa dump -l`) when the layout is empty.
+
+        Returns:
+            Tuple[str, str]: A tuple contain the package_name and ability_name of the foreground application.
+        """
+        observation = self.observation
+        package_name = observation.window.get("bundleName")
+        if observation.is_empty() or not package_name:
+            return self.current_app()
+        return package_name, observation.ability_name
+
+    def get_app_info(self, package_name: str, timeout: Union[float, None] = None) -> Dict:
         """
         Get detailed information about a specific application.
 
         Args:
             package_name (str): The package name of the application to retrieve information for.
+            timeout (float, optional): Give up on `bm dump` after this many seconds.
 
         Returns:
             Dict: A dictionary containing the application information. If an error occurs during parsing,
-                  an empty dictionary is returned.
+                  or `bm dump` fails or times out, an empty dictionary is returned.
         """
         app_info = {}
-        data: CommandResult = self.hdc.shell(f"bm dump -n {package_name}")
+        if timeout is None:
+            data: CommandResult = self.hdc.shell(f"bm dump -n {package_name}")
+        else:
+            data = self.hdc.shell(f"bm dump -n {package_name}", error_raise=False, timeout=timeout)
+            if data.exit_code != 0:
+                logger.error(f"bm dump -n {package_name} failed: {data.error}")
+                return app_info
         output = data.output
         try:
             json_start = output.find("{")
@@ -146,15 +209,29 @@ class Driver:
 
     @delay
     def go_back(self):
-        self.hdc.send_key(KeyCode.BACK)
+        self._invalidate_observation()
+        self.injector.key(KeyCode.BACK)
 
     @delay
     def go_home(self):
-        self.hdc.send_key(KeyCode.HOME)
+        self._invalidate_observation()
+        self.injector.key(KeyCode.HOME)
 
     @delay
     def press_key(self, key_code: Union[KeyCode, int]):
-        self.hdc.send_key(key_code)
+        self._invalidate_observation()
+        self.injector.key(key_code)
+
+    @delay
+    def press_keys(self, key_codes: List[Union[KeyCode, int]]):
+        """
+        Press several keys one after the other, sent to the device in one batch.
+
+        Args:
+            key_codes (List[Union[KeyCode, int]]): The keys to press, in order.
+        """
+        self._invalidate_observation()
+        self.injector.keys(key_codes)
 
     def screen_on(self):
         self.hdc.wakeup()
@@ -189,6 +266,7 @@ class Driver:
         Args:
             rotation (DisplayRotation): The desired display rotation. This should be an instance of the DisplayRotation enum.
         """
+        self._invalidate_observation()
         api = "Driver.setDisplayRotation"
         self._invoke(api, args=[rotation.value])
 
@@ -214,6 +292,7 @@ class Driver:
 
     @delay
     def open_url(self, url: str, system_browser: bool = True):
+        self._invalidate_observation()
         if system_browser:
             # Use the system browser
             self.hdc.shell(f"aa start -A ohos.want.action.viewData -e entity.system.browsable -U {url}")
@@ -253,12 +332,13 @@ class Driver:
         """
         _uuid = uuid.uuid4().hex
         _tmp_path = f"/data/local/tmp/_tmp_{_uuid}.jpeg"
-        self.shell(f"snapshot_display -f {_tmp_path}")
+        self.hdc.shell(f"snapshot_display -f {_tmp_path}")
         self.pull_file(_tmp_path, path)
-        self.shell(f"rm -rf {_tmp_path}")  # remove local path
+        self.hdc.shell(f"rm -rf {_tmp_path}")  # remove local path
         return path
 
     def shell(self, cmd) -> CommandResult:
+        self._invalidate_observation()
         return self.hdc.shell(cmd)
 
     def _to_abs_pos(self, x: Union[int, float], y: Union[int, float]) -> Point:
@@ -285,20 +365,20 @@ class Driver:
 
     @delay
     def click(self, x: Union[int, float], y: Union[int, float]):
-
-        self.hdc.tap(x, y)
-        # point = self._to_abs_pos(x, y)
-        # api = "Driver.click"
-        # self._invoke(api, args=[point.x, point.y])
+        self._invalidate_observation()
+        point = self._to_abs_pos(x, y) if x < 1 or y < 1 else Point(int(x), int(y))
+        self.injector.tap(point.x, point.y)
 
     @delay
     def double_click(self, x: Union[int, float], y: Union[int, float]):
+        self._invalidate_observation()
         point = self._to_abs_pos(x, y)
         api = "Driver.doubleClick"
         self._invoke(api, args=[point.x, point.y])
 
     @delay
     def long_click(self, x: Union[int, float], y: Union[int, float]):
+        self._invalidate_observation()
         point = self._to_abs_pos(x, y)
         api = "Driver.longClick"
         self._invoke(api, args=[point.x, point.y])
@@ -315,6 +395,7 @@ class Driver:
             y2 (float): The end Y coordinate as a percentage or absolute value.
             speed (int, optional): The swipe speed in pixels per second. Default is 2000. Range: 200-40000. If not within the range, set to default value of 2000.
         """
+        self._invalidate_observation()
 
         point1 = self._to_abs_pos(x1, y1)
         point2 = self._to_abs_pos(x2, y2)
@@ -323,8 +404,7 @@ class Driver:
             logger.warning("`speed` is not in the range[200-40000], Set to default value of 2000.")
             speed = 2000
 
-        api = "Driver.swipe"
-        self._invoke(api, args=[point1.x, point1.y, point2.x, point2.y, speed])
+        self.injector.swipe(point1.x, point1.y, point2.x, point2.y, speed)
 
     @cached_property
     def swipe_ext(self):
@@ -345,7 +425,24 @@ class Driver:
         Args:
             text (str): input value
         """
-        return self._invoke("Driver.inputText", args=[{"x": 1, "y": 1}, text])
+        self._invalidate_observation()
+        self.injector.text(text)
+
+    @delay
+    def enter_text(self, text: str, clear_length: int = 0, submit: bool = True) -> bool:
+        """
+        Replaces the text of the focused input field with `text` in one pipelined call.
+
+        Args:
+            text (str): input value
+            clear_length (int): Number of DEL presses clearing the field if it has to be done with key events.
+            submit (bool): Press ENTER after typing.
+
+        Returns:
+            bool: Whether the field is known to hold `text`.
+        """
+        self._invalidate_observation()
+        return self.injector.enter_text(text, clear_length, submit)
 
     def dump_hierarchy(self) -> Dict:
         """
@@ -354,25 +451,85 @@ class Driver:
         Returns:
             Dict: The dumped UI hierarchy as a dictionary.
         """
-        # return self._client.invoke_captures("captureLayout").result
+        if self._layout_over_socket:
+            try:
+                return self._client.capture_layout()
+            except (InvokeCaptures, InvokeHypiumError) as e:
+                # The uitest agent can not capture layouts here, keep using `uitest dumpLayout` from now on.
+                logger.warning(f"Layout capture over the uitest socket failed, fall back to dumpLayout: {e}")
+                self._layout_over_socket = False
+            except (OSError, ValueError, InvokeNoReplyError) as e:
+                # The client has reset the connection, the next dump tries the socket again.
+                logger.warning(f"Layout capture over the uitest socket failed, using dumpLayout once: {e}")
         return self.hdc.dump_hierarchy()
 
     def dump_simple_hierarchy(self) -> Dict:
-        hierarchy = self.dump_hierarchy()
+        """
+        The hierarchy of the current observation, keeping only the bounds, clickable and type attributes.
+        """
+        tree = self.observation.tree
+        nodes = []
+        for index in range(len(tree)):
+            attributes = {key: value for key, value in tree.attributes_of(index).items()
+                          if key == "bounds" or key == "clickable" or key == "type"}
+            node = {"attributes": attributes, "children": []}
+            nodes.append(node)
+            if tree.parent[index] >= 0:
+                nodes[tree.parent[index]]["children"].append(node)
+        return nodes[0] if nodes else {}
+
+    @cached_property
+    def observation(self) -> Observation:
+        """
+        The UI observation of the current step.
+
+        It is captured on first access and shared by every caller until the next input event
+        sent through the driver invalidates it.
+        """
+        return Observation(self.dump_hierarchy())
+
+    def observe(self) -> Observation:
+        """
+        Drop the current observation and capture a fresh one, e.g. once the UI has settled after an action.
+        """
+        self._invalidate_observation()
+        return self.observation
+
+    def set_observation(self, observation: Observation):
+        """
+        Make an observation captured elsewhere (e.g. by the settle engine) the current one.
+        """
+        self.__dict__["observation"] = observation
+
+    def _invalidate_observation(self):
+        self._invalidate_cache("observation")
+
+    @cached_property
+    def settler(self):
+        from .settle import Settler
+        return Settler(self)
+
+    def wait_settled(self, key: Union[str, None] = None) -> Observation:
+        """
+        Wait until the UI has settled after an input event and capture it as the current observation.
+
+        Args:
+            key (str, optional): The page the event was sent on, its settle time is learned.
 
-        def dfs(node: dict) -> None:
-            duplicated_attributes = []
-            for key, value in node["attributes"].items():
-                if key != "bounds" and key != "clickable" and key != "type":
-                    duplicated_attributes.append(key)
-            for key in duplicated_attributes:
-                del node["attributes"][key]
-            for child in node["children"]:
-                dfs(child)
+        Returns:
+            Observation: The observation of the settled UI.
+        """
+        return self.settler.wait(key)
 
-        dfs(hierarchy)
-        return hierarchy
+    @cached_property
+    def injector(self):
+        from ._input import _InputInjector
+        return _InputInjector(self)
 
+    @cached_property
+    def restarter(self):
+        from .restart import Restarter
+        return Restarter(self)
 
     @cached_property
     def gesture(self):
@@ -411,27 +568,16 @@ class Driver:
     #         return ability_name
     #     return ""
 
-    def get_ability_and_page(self):
-        root = self.dump_hierarchy()
-        node = root["children"][0]
-        ability_name = node["attributes"]["abilityName"]
-        page_path = node["attributes"]["pagePath"]
-        return ability_name, page_path
+    def get_ability_and_page(self) -> Tuple[str, str]:
+        observation = self.observation
+        return observation.ability_name, observation.page_path
 
     def keyboard_exist(self, retries: int = 1, wait_time=1) -> bool:
-        def dfs(node: dict) -> bool:
-            if node["attributes"]["id"] == "KeyCanvasKeyboard":
-                return True
-            for child in node["children"]:
-                if dfs(child):
-                    return True
-            return False
-
         for attempt in range(retries):
-            root = self.dump_hierarchy()
-            if dfs(root):
+            observation = self.observation if attempt == 0 else self.observe()
+            if observation.keyboard_exist:
                 return True
-            if attempt < retries:
+            if attempt < retries - 1:
                 time.sleep(wait_time)
                 logger.info(f"Retry found element {self}")
         return False
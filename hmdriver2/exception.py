@@ -32,6 +32,11 @@ class InvokeCaptures(Exception):
     pass
 
 
+class InvokeNoReplyError(Exception):
+    """A request was sent but no valid reply came back, so it may or may not have been carried out."""
+    pass
+
+
 class InjectGestureError(Exception):
     pass
 
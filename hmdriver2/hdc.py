@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import os
 import tempfile
 import json
+import time
 import uuid
 import shlex
 import re
 import subprocess
+import threading
+from queue import Queue, Empty
 from typing import Union, List, Dict, Tuple
 
 # from . import logger
@@ -29,9 +33,13 @@ __all__ = ['logger']
 from .utils import FreePort
 from .proto import CommandResult, KeyCode
 from .exception import HdcError, DeviceNotFoundError
+from ._hdc_native import HdcServerClient
 
+SHELL_TIMEOUT = 30
+SHELL_STARTUP_TIMEOUT = 5
 
-def _execute_command(cmdargs: Union[str, List[str]]) -> CommandResult:
+
+def _execute_command(cmdargs: Union[str, List[str]], timeout: Union[float, None] = None) -> CommandResult:
     if isinstance(cmdargs, (list, tuple)):
         cmdline: str = ' '.join(list(map(shlex.quote, cmdargs)))
     elif isinstance(cmdargs, str):
@@ -41,7 +49,12 @@ def _execute_command(cmdargs: Union[str, List[str]]) -> CommandResult:
     try:
         process = subprocess.Popen(cmdline, stdout=subprocess.PIPE,
                                    stderr=subprocess.PIPE, shell=True)
-        output, error = process.communicate()
+        try:
+            output, error = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            return CommandResult("", f"Command timed out after {timeout}s: {cmdline}", -1)
         output = output.decode('utf-8')
         error = error.decode('utf-8')
         exit_code = process.returncode
@@ -54,7 +67,145 @@ def _execute_command(cmdargs: Union[str, List[str]]) -> CommandResult:
         return CommandResult("", str(e), -1)
 
 
+class _ShellSession:
+    """
+    A long-lived interactive `hdc -t <serial> shell` that runs one command at a time.
+
+    Every command is framed by a begin and an end marker printed by the device shell, the end
+    marker carrying the exit code, so the output of one command can be cut out of the stream.
+    The markers are printed from two quoted halves, so the echoed command line never matches them.
+    """
+    _BEGIN = "__HMTEST_BEGIN__"
+    _END = "__HMTEST_END__"
+
+    def __init__(self, serial: str):
+        self.serial = serial
+        self.usable = True
+        self._process: Union[subprocess.Popen, None] = None
+        self._lines: Queue = Queue()
+        self._lock = threading.Lock()
+
+    def _alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self):
+        logger.debug(f"Start persistent shell session of {self.serial}")
+        try:
+            self._process = subprocess.Popen(["hdc", "-t", self.serial, "shell"], stdin=subprocess.PIPE,
+                                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0)
+        except OSError as e:
+            self.usable = False
+            raise HdcError("HDC shell session error", str(e))
+        self._lines = Queue()
+        reader = threading.Thread(target=self._read_lines, args=(self._process.stdout, self._lines))
+        reader.daemon = True
+        reader.start()
+        self._write("stty -echo 2>/dev/null; PS1=''; PS2=''\n")
+        try:
+            self._run("true", SHELL_STARTUP_TIMEOUT)
+        except (HdcError, TimeoutError) as e:
+            self.usable = False
+            self.close()
+            raise HdcError("HDC shell session error", f"the shell session did not answer: {e}")
+
+    @staticmethod
+    def _read_lines(stream, lines: Queue):
+        for raw in iter(stream.readline, b""):
+            lines.put(raw.decode("utf-8", errors="replace"))
+        lines.put(None)
+
+    def _write(self, data: str):
+        try:
+            self._process.stdin.write(data.encode("utf-8"))
+            self._process.stdin.flush()
+        except (OSError, ValueError) as e:
+            self.close()
+            raise HdcError("HDC shell session error", str(e))
+
+    def _next_line(self, deadline: float) -> str:
+        try:
+            line = self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+        except Empty:
+            raise TimeoutError("no answer from the shell session")
+        if line is None:
+            self.close()
+            raise HdcError("HDC shell session error", "the shell session exited")
+        return line
+
+    def _run(self, cmd: str, timeout: float) -> Tuple[str, int]:
+        token = uuid.uuid4().hex
+        begin, end = f"{self._BEGIN}{token}", f"{self._END}{token}:"
+        # Commands get /dev/null as stdin, otherwise they could swallow the end marker.
+        self._write(f"printf '%s%s\\n' '{self._BEGIN}' '{token}'\n"
+                    f"{{ {cmd}\n}} </dev/null\n"
+                    f"printf '%s%s:%d\\n' '{self._END}' '{token}' $?\n")
+        deadline = time.monotonic() + timeout
+        while begin not in self._next_line(deadline):
+            pass
+        output = []
+        while True:
+            try:
+                line = self._next_line(deadline)
+            except HdcError:
+                # The command has already started, running it again through a fallback could repeat it.
+                return "".join(output), -1
+            index = line.find(end)
+            if index < 0:
+                output.append(line)
+                continue
+            output.append(line[:index])
+            exit_code = line[index + len(end):].strip()
+            return "".join(output), int(exit_code) if exit_code.lstrip("-").isdigit() else -1
+
+    def execute(self, cmd: str, timeout: float = SHELL_TIMEOUT) -> CommandResult:
+        """
+        Run a command in the session.
+
+        Raises:
+            HdcError: The session can not be used, the caller should fall back to a new process.
+            TimeoutError: The command did not finish in time; the session is closed and restarted on next use.
+        """
+        with self._lock:
+            if not self._alive():
+                self._start()
+            logger.debug(f"hdc -t {self.serial} shell (session) {cmd}")
+            try:
+                output, exit_code = self._run(cmd, timeout)
+            except TimeoutError:
+                self.close()
+                raise
+        if output.lower().__contains__('error:'):
+            return CommandResult("", output, -1)
+        return CommandResult(output, "", exit_code)
+
+    def close(self):
+        if self._process is None:
+            return
+        try:
+            self._process.kill()
+            self._process.wait(timeout=1)
+        except Exception as e:
+            logger.debug(f"Error while closing shell session: {e}")
+        self._process = None
+
+
+_native_client = HdcServerClient()
+
+
+def _to_result(output: str) -> CommandResult:
+    """Turn the output of a native hdc command into a CommandResult, like the CLI fallback."""
+    if output.lower().__contains__('error:') or output.__contains__('[Fail]'):
+        return CommandResult("", output, -1)
+    return CommandResult(output, "", 0)
+
+
 def list_devices() -> List[str]:
+    if _native_client.usable:
+        try:
+            return _native_client.list_targets()
+        except (HdcError, TimeoutError) as e:
+            logger.warning(f"HDC server unavailable, fall back to the hdc CLI: {e}")
+
     devices = []
     result = _execute_command('hdc list targets')
     if result.exit_code == 0 and result.output:
@@ -71,10 +222,16 @@ def list_devices() -> List[str]:
 
 
 class HdcWrapper:
-    def __init__(self, serial: str) -> None:
+    def __init__(self, serial: str, persistent_shell: bool = True, native: bool = True) -> None:
         self.serial = serial
+        self._native = _native_client if native else None
         if not self.is_online():
             raise DeviceNotFoundError(f"Device [{self.serial}] not found")
+        self._shell_session = _ShellSession(serial) if persistent_shell else None
+
+    def close(self):
+        if self._shell_session:
+            self._shell_session.close()
 
     def is_online(self):
         _serials = list_devices()
@@ -83,15 +240,29 @@ class HdcWrapper:
     def is_emulator(self):
         return '127.0.0.1' in self.serial
 
+    def _execute_hdc(self, command: str, timeout: Union[float, None] = None) -> CommandResult:
+        """
+        Run an hdc command for this device through the hdc server socket, falling back to the hdc CLI
+        when the server can not be reached.
+        """
+        if self._native and self._native.usable:
+            try:
+                return _to_result(self._native.command(command, self.serial, timeout))
+            except TimeoutError as e:
+                return CommandResult("", str(e), -1)
+            except HdcError as e:
+                logger.warning(f"HDC server unavailable, fall back to the hdc CLI: {e}")
+        return _execute_command(f"hdc -t {self.serial} {command}", timeout)
+
     def forward_port(self, rport: int) -> int:
         lport: int = FreePort().get()
-        result = _execute_command(f"hdc -t {self.serial} fport tcp:{lport} tcp:{rport}")
+        result = self._execute_hdc(f"fport tcp:{lport} tcp:{rport}")
         if result.exit_code != 0:
             raise HdcError("HDC forward port error", result.error)
         return lport
 
     def rm_forward(self, lport: int, rport: int) -> int:
-        result = _execute_command(f"hdc -t {self.serial} fport rm tcp:{lport} tcp:{rport}")
+        result = self._execute_hdc(f"fport rm tcp:{lport} tcp:{rport}")
         if result.exit_code != 0:
             raise HdcError("HDC rm forward error", result.error)
         return lport
@@ -100,7 +271,7 @@ class HdcWrapper:
         """
         eg.['tcp:10001 tcp:8012', 'tcp:10255 tcp:8012']
         """
-        result = _execute_command(f"hdc -t {self.serial} fport ls")
+        result = self._execute_hdc("fport ls")
         if result.exit_code != 0:
             raise HdcError("HDC forward list error", result.error)
         pattern = re.compile(r"tcp:\d+ tcp:\d+")
@@ -113,17 +284,39 @@ class HdcWrapper:
         return result
 
     def recv_file(self, rpath: str, lpath: str):
-        result = _execute_command(f"hdc -t {self.serial} file recv {rpath} {lpath}")
+        result = self._execute_hdc(f"file recv {rpath} {lpath}")
         if result.exit_code != 0:
             raise HdcError("HDC receive file error", result.error)
         return result
 
-    def shell(self, cmd: str, error_raise=True) -> CommandResult:
-        result = _execute_command(f"hdc -t {self.serial} shell {cmd}")
+    def shell(self, cmd: str, error_raise=True, timeout: float = SHELL_TIMEOUT) -> CommandResult:
+        result = self._execute_shell(cmd, timeout)
         if result.exit_code != 0 and error_raise:
             raise HdcError("HDC shell error", f"{cmd}\n{result.output}\n{result.error}")
         return result
 
+    def _execute_shell(self, cmd: str, timeout: float) -> CommandResult:
+        """
+        Run a shell command through the persistent session, falling back to a shell channel on the hdc
+        server socket and then to a new `hdc shell` process when neither can be used.
+        """
+        session = self._shell_session
+        if session and session.usable:
+            try:
+                return session.execute(cmd, timeout)
+            except TimeoutError:
+                return CommandResult("", f"Command timed out after {timeout}s: {cmd}", -1)
+            except HdcError as e:
+                logger.warning(f"Shell session unavailable, fall back to the hdc server: {e}")
+        if self._native and self._native.usable:
+            try:
+                return self._native.shell(self.serial, cmd, timeout)
+            except TimeoutError as e:
+                return CommandResult("", str(e), -1)
+            except HdcError as e:
+                logger.warning(f"HDC server unavailable, fall back to a new process: {e}")
+        return _execute_command(f"hdc -t {self.serial} shell {cmd}", timeout)
+
     def uninstall(self, bundlename: str):
         result = _execute_command(f"hdc -t {self.serial} uninstall {bundlename}")
         return result
@@ -146,6 +339,24 @@ class HdcWrapper:
     def start_app(self, package_name: str, ability_name: str):
         return self.shell(f"aa start -a {ability_name} -b {package_name}")
 
+    def start_ability(self, package_name: str, ability_name: str, uri: Union[str, None] = None,
+                      params: Union[Dict, None] = None) -> CommandResult:
+        """
+        Start an ability with a want carrying `uri` and `params` (str, int and bool values become --ps, --pi
+        and --pb parameters).
+        """
+        cmd = f"aa start -a {ability_name} -b {package_name}"
+        if uri:
+            cmd += f" -U {shlex.quote(uri)}"
+        for key, value in (params or {}).items():
+            if isinstance(value, bool):
+                cmd += f" --pb {shlex.quote(key)} {str(value).lower()}"
+            elif isinstance(value, int):
+                cmd += f" --pi {shlex.quote(key)} {value}"
+            else:
+                cmd += f" --ps {shlex.quote(key)} {shlex.quote(str(value))}"
+        return self.shell(cmd, error_raise=False)
+
     def stop_app(self, package_name: str):
         return self.shell(f"aa force-stop {package_name}")
 
@@ -267,15 +478,17 @@ class HdcWrapper:
         _tmp_path = f"/data/local/tmp/{self.serial}_tmp.json"
         self.shell(f"uitest dumpLayout -p {_tmp_path}")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as f:
-            path = f.name
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
             self.recv_file(_tmp_path, path)
-
             try:
                 with open(path, 'r', encoding='utf-8') as file:
                     data = json.load(file)
             except Exception as e:
                 logger.error(f"Error loading JSON file: {e}")
                 data = {}
+        finally:
+            os.remove(path)
 
-            return data
+        return data
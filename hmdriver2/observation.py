@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import time
+from functools import cached_property
+from typing import Dict, List, Any, Union
+
+from .compact_tree import CompactTree
+
+
+class Observation:
+    """
+    A snapshot of the device UI taken from a single layout dump.
+
+    The driver hands out the same observation until the next input event invalidates it,
+    so the detector, the agents and the actions of one exploration step share one dump.
+    The dump is kept as a `CompactTree`; the nested dict is only rebuilt when asked for.
+    """
+
+    def __init__(self, hierarchy: Dict):
+        self.tree = CompactTree(hierarchy)
+        self.timestamp = time.time()
+        # Filled in by the action detector the first time it sees this observation.
+        self.actions: Union[List[Any], None] = None
+        # Set once the settle engine has seen the UI stop changing.
+        self.settled = False
+
+    @cached_property
+    def hierarchy(self) -> Dict:
+        return self.tree.to_dict()
+
+    def is_empty(self) -> bool:
+        return not len(self.tree)
+
+    @cached_property
+    def window(self) -> Dict:
+        """Attributes of the top window node, which carries bundleName/abilityName/pagePath."""
+        if len(self.tree) < 2:
+            return {}
+        return self.tree.attributes_of(1)
+
+    @property
+    def ability_name(self) -> str:
+        return self.window.get("abilityName", "")
+
+    @property
+    def page_path(self) -> str:
+        return self.window.get("pagePath", "")
+
+    @property
+    def keyboard_exist(self) -> bool:
+        return "KeyCanvasKeyboard" in self.tree.by_id
+
+    @cached_property
+    def fingerprint(self) -> int:
+        """
+        A cheap hash of the layout structure (node types and bounds), used to tell whether the UI is still changing.
+        Texts are left out so that a ticking clock or a progress label does not keep a page from settling.
+        """
+        tree = self.tree
+        return hash((tuple(tree.types), tree.type_id.tobytes(), tree.parent.tobytes(), tree.bounds.tobytes()))
+
+    @cached_property
+    def digest(self) -> str:
+        """
+        Content digest of what the action detector reads: ability, page, node types, structure, bounds and
+        clickable flags. Texts, hash codes and other volatile attributes are left out, so two dumps of the same
+        screen share a digest. Unlike `fingerprint` it is stable across processes.
+        """
+        tree = self.tree
+        h = hashlib.blake2b(digest_size=16)
+        h.update("\0".join([self.ability_name, self.page_path, *tree.types]).encode("utf-8"))
+        for array in (tree.type_id, tree.parent, tree.bounds, tree.clickable):
+            h.update(array.tobytes())
+        return h.hexdigest()
+
+    def __str__(self) -> str:
+        return f"Observation(abilityName={self.ability_name}, pagePath={self.page_path}, keyboard={self.keyboard_exist})"
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import time
+from typing import Dict, Union, TYPE_CHECKING
+
+from . import logger
+from .observation import Observation
+
+if TYPE_CHECKING:
+    from .driver import Driver
+
+
+class Restarter:
+    """
+    Restarts the app under test without going through the launcher.
+
+    A cold restart kills the app with `aa force-stop` and starts it with `aa start`, both over the persistent
+    shell, then polls the layout until the window of the started ability is in the foreground. A warm restart
+    keeps the process and presses BACK until the page the app last cold-started on is shown again; it falls
+    back to a cold restart when the app is not in the foreground, leaves it, or the page is not reached within
+    `max_back` presses.
+    """
+
+    def __init__(self, d: 'Driver', mode: str = "cold", launch_timeout: float = 10.0, interval: float = 0.2,
+                 max_back: int = 8):
+        """
+        Args:
+            d (Driver): The driver to restart the app with.
+            mode (str): "cold" or "warm", the kind of restart `restart` does by default.
+            launch_timeout (float): Give up waiting for the started ability after this time, in seconds.
+            interval (float): Time between two layout polls while waiting for the ability, in seconds.
+            max_back (int): Maximum number of BACK presses of a warm restart.
+        """
+        self.d = d
+        self.mode = mode
+        self.launch_timeout = launch_timeout
+        self.interval = interval
+        self.max_back = max_back
+        # Page each app showed first after its last cold start, by bundle name.
+        self.home_pages: Dict[str, str] = {}
+
+    def configure(self, **kwargs):
+        for key, value in kwargs.items():
+            if not hasattr(self, key) or key in ("d", "home_pages"):
+                raise ValueError(f"Unknown restart option: {key}")
+            setattr(self, key, value)
+
+    @staticmethod
+    def _is_foreground(observation: Observation, package_name: str, ability_name: str) -> bool:
+        window = observation.window
+        return window.get("bundleName") == package_name and window.get("abilityName") == ability_name
+
+    def restart(self, package_name: str, ability_name: str, warm: Union[bool, None] = None) -> Observation:
+        """
+        Restart the app and return the first observation of it.
+
+        Args:
+            package_name (str): The bundle name of the application.
+            ability_name (str): The ability to start.
+            warm (bool, optional): Pop the navigation stack instead of restarting the process. Defaults to the
+                configured mode.
+        """
+        if warm is None:
+            warm = self.mode == "warm"
+        if warm:
+            observation = self.warm(package_name, ability_name)
+            if observation is not None:
+                return observation
+        return self.cold(package_name, ability_name)
+
+    def cold(self, package_name: str, ability_name: str) -> Observation:
+        start = time.monotonic()
+        self.d.stop_app(package_name)
+        self.d.hdc.start_app(package_name, ability_name)
+        observation = self.d.observe()
+        while not self._is_foreground(observation, package_name, ability_name):
+            if time.monotonic() - start >= self.launch_timeout:
+                logger.warning(f"{package_name}/{ability_name} not in the foreground after {self.launch_timeout}s")
+                break
+            time.sleep(self.interval)
+            observation = self.d.observe()
+        else:
+            self.home_pages[package_name] = observation.page_path
+        logger.debug(f"Cold restart of {package_name} took {time.monotonic() - start:.2f}s")
+        return observation
+
+    def warm(self, package_name: str, ability_name: str) -> Union[Observation, None]:
+        """Press BACK until the home page is shown. Returns None when a cold restart is needed instead."""
+        home_page = self.home_pages.get(package_name)
+        if home_page is None:
+            return None
+        observation = self.d.observation
+        for _ in range(self.max_back + 1):
+            if not self._is_foreground(observation, package_name, ability_name):
+                return None
+            if observation.page_path == home_page:
+                return observation
+            self.d.go_back()
+            observation = self.d.wait_settled(f"back:{observation.page_path}")
+        return None
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import time
+from typing import Dict, Union, TYPE_CHECKING
+
+from . import logger
+from .observation import Observation
+
+if TYPE_CHECKING:
+    from .driver import Driver
+
+
+class Settler:
+    """
+    Waits until the UI is stable after an input event instead of sleeping for a fixed time.
+
+    The layout is polled until its fingerprint stops changing for `stable_count` consecutive polls, bounded by
+    `min_wait` and `max_wait` seconds. How long each page took to settle is learned (moving average), so polling
+    on a page known to animate for a while starts late instead of dumping the layout over and over.
+    """
+
+    def __init__(self, d: 'Driver', min_wait: float = 0.3, max_wait: float = 3.0, interval: float = 0.2,
+                 stable_count: int = 2, smoothing: float = 0.3):
+        """
+        Args:
+            d (Driver): The driver to observe the UI with.
+            min_wait (float): Minimum time to wait after the event, in seconds.
+            max_wait (float): Give up waiting after this time and take the UI as it is, in seconds.
+            interval (float): Minimum time between two layout polls, in seconds.
+            stable_count (int): Number of consecutive polls with the same fingerprint to consider the UI settled.
+            smoothing (float): Weight of the latest measurement in the learned settle time of a page.
+        """
+        self.d = d
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.interval = interval
+        self.stable_count = stable_count
+        self.smoothing = smoothing
+        self.learned: Dict[str, float] = {}
+
+    def configure(self, **kwargs):
+        for key, value in kwargs.items():
+            if not hasattr(self, key) or key in ("d", "learned"):
+                raise ValueError(f"Unknown settle option: {key}")
+            setattr(self, key, value)
+
+    def wait(self, key: Union[str, None] = None) -> Observation:
+        """
+        Block until the UI has settled and return the observation of the settled UI, which also becomes the
+        driver's current observation. Returns at once if no input event was sent since the UI last settled.
+
+        Args:
+            key (str, optional): The page the event was sent on, used to learn its settle time.
+        """
+        current = self.d.__dict__.get("observation")
+        if current is not None and current.settled:
+            # No input event since the UI last settled.
+            return current
+
+        start = time.monotonic()
+        head_start = self.learned.get(key, 0) if key is not None else 0
+        time.sleep(min(max(self.min_wait, head_start), self.max_wait))
+
+        observation = self.d.observe()
+        changed_at = start
+        stable = 1
+        while stable < self.stable_count:
+            remaining = self.max_wait - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+            time.sleep(min(self.interval, remaining))
+            current = Observation(self.d.dump_hierarchy())
+            if current.fingerprint == observation.fingerprint:
+                stable += 1
+            else:
+                stable = 1
+                changed_at = time.monotonic()
+            observation = current
+
+        elapsed = time.monotonic() - start
+        if stable < self.stable_count:
+            logger.debug(f"UI not settled after {elapsed:.2f}s on {key}")
+        if key is not None:
+            settle_time = changed_at - start
+            previous = self.learned.get(key)
+            self.learned[key] = settle_time if previous is None else \
+                previous + self.smoothing * (settle_time - previous)
+
+        observation.settled = True
+        self.d.set_observation(observation)
+        return observation
@@ -10,17 +10,22 @@ from typing import Union
 from .proto import Bounds
 
 
+# Seconds to wait after each UI operation. Callers that wait for the UI to settle themselves
+# (see `Driver.wait_settled`) can lower it, down to 0.
+DELAY_TIME = 0.6
+
+
 def delay(func):
     """
     After each UI operation, it is necessary to wait for a while to ensure the stability of the UI,
     so as not to affect the next UI operation.
     """
-    DELAY_TIME = 0.6
 
     @wraps(func)
     def wrapper(*args, **kwargs):
         result = func(*args, **kwargs)
-        time.sleep(DELAY_TIME)
+        if DELAY_TIME > 0:
+            time.sleep(DELAY_TIME)
         return result
     return wrapper
 
@@ -1,30 +1,42 @@
 # -*- coding: utf-8 -*-
 
-from typing import Dict
+from typing import Dict, Tuple, Union
 from lxml import etree
 from functools import cached_property
 
 from . import logger
 from .proto import Bounds
 from .driver import Driver
+from .observation import Observation
 from .utils import delay, parse_bounds
 from .exception import XmlElementNotFoundError
 import re
 
 
 class _XPath:
+    # Absolute positional paths, as generated by the action detector: //root[1]/Column[1]/Button[2]
+    _POSITIONAL_RE = re.compile(r"//?\w+\[\d+](?:/\w+\[\d+])*")
+
     def __init__(self, d: Driver):
         self._d = d
+        self._xml: Union[Tuple[Observation, etree.Element], None] = None
 
     def __call__(self, xpath: str) -> 'XMLElement':
 
-        hierarchy: Dict = self._d.dump_hierarchy()
-        if not hierarchy:
+        observation = self._d.observation
+        if observation.is_empty():
             logger.error(f"xpath: {xpath} not found")
             return XMLElement(None, None, {}, self._d)
 
-        xml = _XPath._json2xml(hierarchy)
-        result = xml.xpath(xpath)
+        if self._POSITIONAL_RE.fullmatch(xpath):
+            index = observation.tree.find_by_xpath(xpath)
+            if index is not None:
+                attributes = observation.tree.attributes_of(index)
+                bounds: Bounds = parse_bounds(attributes.get("bounds", ""))
+                logger.debug(f"{xpath} Bounds: {bounds}")
+                return XMLElement(bounds, observation.tree.type_of(index), attributes, self._d)
+
+        result = self._to_xml(observation).xpath(xpath)
 
         if len(result) > 0:
             node = result[0]
@@ -32,11 +44,17 @@ class _XPath:
             bounds: Bounds = parse_bounds(raw_bounds)
             logger.debug(f"{xpath} Bounds: {bounds}")
             types = re.findall(r'//?(\w+)\[\d+]', xpath)
-            return XMLElement(bounds, types[-1], node.attrib, self._d)
+            return XMLElement(bounds, types[-1] if types else node.tag, node.attrib, self._d)
 
         logger.error(f"xpath: {xpath} not found")
         return XMLElement(None, None, {}, self._d)
 
+    def _to_xml(self, observation: Observation) -> etree.Element:
+        """The lxml tree of an observation, converted once and reused while the observation is current."""
+        if self._xml is None or self._xml[0] is not observation:
+            self._xml = (observation, _XPath._json2xml(observation.hierarchy))
+        return self._xml[1]
+
     @staticmethod
     def _json2xml(hierarchy: Dict) -> etree.Element:
         attributes = hierarchy.get("attributes", {})
@@ -7,11 +7,12 @@ from app_test import AppTest
 from hmdriver2.driver import Driver
 
 
-def main(serial, app, project_path, module_name, t):
-    shutil.rmtree("output")
+def main(serial, app, project_path, module_name, t, resume=False):
+    if not resume:
+        shutil.rmtree("output")
     product_name = "default"
     start_time = time.time()
-    app_test = AppTest(serial, app, project_path, module_name, product_name, t)
+    app_test = AppTest(serial, app, project_path, module_name, product_name, t, resume=resume)
     app_test.start_test()
     print(f"Test Finish! Total Time: {time.time() - start_time} seconds.")
 
@@ -26,7 +27,9 @@ if __name__ == '__main__':
     parser.add_argument("--product_name", type=str, required=False, help="The product name of the open-source app")
     parser.add_argument("--test_time", type=str, required=False, help="The total time you want to test")
     parser.add_argument("--seed", type=str, required=False, help="Random seed")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the interrupted run in ./output from its store and latest checkpoint")
     args = parser.parse_args()
     if args.seed:
         random.seed(args.seed)
-    main(args.serial, args.bundle_name, args.project_path, args.module_name, args.test_time)
+    main(args.serial, args.bundle_name, args.project_path, args.module_name, args.test_time, args.resume)
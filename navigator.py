@@ -0,0 +1,63 @@
+import logging
+from typing import Any, Dict, Set, Union
+
+from config import LogConfig
+from config.event_log import event_log
+from hmdriver2.driver import Driver
+
+logger = logging.getLogger(__name__)
+logger.addHandler(LogConfig.get_file_handler())
+
+
+class Navigator:
+    """
+    Opens pages of the app directly with `aa start`, so recovery does not have to restart the app and replay a
+    click path.
+
+    A page can be reached when `deep_links` maps its path to a launch (`ability`, `uri` and `params` of the
+    want), or, with a debug build whose entry ability routes to the page passed in the `router_param` want
+    parameter, when the PTG has it as the target of a router edge. Arrival is checked on the settled
+    observation; a jump that lands elsewhere returns False and the caller falls back to the click path.
+    """
+
+    def __init__(self, d: Driver, app: str, ability_name: str, PTG: Dict[str, list],
+                 deep_links: Union[Dict[str, Dict[str, Any]], None] = None, router_param: Union[str, None] = None):
+        self.d = d
+        self.app = app
+        self.ability_name = ability_name
+        self.PTG = PTG
+        self.deep_links = deep_links or {}
+        self.router_param = router_param
+        # Pages a jump did not arrive at, they are not tried again.
+        self.failed: Set[str] = set()
+
+    def router_targets(self) -> Set[str]:
+        return {edge["targetPage"] for edges in self.PTG.values() for edge in edges if edge.get("targetPage")}
+
+    def can_jump(self, page_path: Union[str, None]) -> bool:
+        if page_path is None or page_path in self.failed:
+            return False
+        if page_path in self.deep_links:
+            return True
+        return self.router_param is not None and page_path in self.router_targets()
+
+    def jump(self, page_path: Union[str, None]) -> bool:
+        """Cold-start the app on `page_path`. Returns whether the settled UI is that page."""
+        if not self.can_jump(page_path):
+            return False
+        link = self.deep_links.get(page_path)
+        if link is not None:
+            ability_name, uri, params = link.get("ability", self.ability_name), link.get("uri"), link.get("params")
+        else:
+            ability_name, uri, params = self.ability_name, None, {self.router_param: page_path}
+        self.d.stop_app(self.app)
+        if not self.d.start_ability(self.app, ability_name, uri, params):
+            self.failed.add(page_path)
+            return False
+        observation = self.d.wait_settled(f"jump:{page_path}")
+        if observation.page_path != page_path:
+            event_log.info("jump failed", target_page=page_path, page=observation.page_path)
+            self.failed.add(page_path)
+            return False
+        event_log.info("jump", target_page=page_path)
+        return True
@@ -1,38 +1,77 @@
-from typing import List, Dict, Any, Tuple, Set
+from typing import List, Dict, Any, Tuple
 
-from action.impl.back_action import BackAction
+import numpy as np
+
+from action.action_registry import action_registry
 from action.window_action import WindowAction
 from state.window_state import WindowState
 
 
 class ActionSetState(WindowState):
+    """
+    A screen identified by its ability, page and the set of actions detected on it.
+
+    Actions are held as registry ids: `action_ids` is the sorted set used for equality and hashing, `_order`
+    keeps the detection order `get_action_list` returns. The hash is computed once, so dictionary lookups
+    and comparisons never touch the action objects. A pickled state carries its actions and is interned
+    again when loaded, so it does not depend on the registry it was saved from.
+    """
+    __slots__ = ("action_ids", "_order", "ability_name", "page_path", "_hash")
+
     def __init__(self, actions: List[WindowAction], ability_name: str, page_path: str) -> None:
-        # self.action_set: Set[WindowAction] = set(actions)
-        self.action_list = actions.copy()
+        self._init(np.array(action_registry.ids_of(actions), dtype=np.int32), ability_name, page_path)
+
+    def _init(self, order: np.ndarray, ability_name: str, page_path: str) -> None:
+        self._order = order
+        self.action_ids = np.unique(order)
         self.ability_name = ability_name
         self.page_path = page_path
+        self._hash = hash((self.action_ids.tobytes(), ability_name, page_path))
+
+    @classmethod
+    def from_ids(cls, action_ids: List[int], ability_name: str, page_path: str) -> 'ActionSetState':
+        state = cls.__new__(cls)
+        state._init(np.array(action_ids, dtype=np.int32), ability_name, page_path)
+        return state
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact form of the state, the actions are registry ids (see `ActionRegistry.actions`)."""
+        return {"ability_name": self.ability_name, "page_path": self.page_path, "actions": self._order.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ActionSetState':
+        return cls.from_ids(data["actions"], data["ability_name"], data["page_path"])
+
+    @classmethod
+    def _unpickle(cls, action_ids: List[int], actions: List[WindowAction], ability_name: str,
+                  page_path: str) -> 'ActionSetState':
+        return cls.from_ids(action_registry.place(action_ids, actions), ability_name, page_path)
+
+    def __reduce__(self):
+        return ActionSetState._unpickle, (self._order.tolist(), self.get_action_list(), self.ability_name,
+                                          self.page_path)
+
+    @property
+    def action_list(self) -> List[WindowAction]:
+        return self.get_action_list()
 
     def similarity(self, other: WindowState) -> float:
         if not isinstance(other, ActionSetState):
             return 0
         if self.ability_name != other.ability_name or self.page_path != other.page_path:
             return 0
-        s = set(self.action_list)
-        t = set(other.action_list)
-        intersection = len(s.intersection(t))
-        union = len(s.union(t))
+        intersection = len(np.intersect1d(self.action_ids, other.action_ids, assume_unique=True))
+        union = len(self.action_ids) + len(other.action_ids) - intersection
         if union == 0:
             return 0
         return intersection / union
 
     def get_action_list(self) -> List[WindowAction]:
-        # action_list = list(self.action_set)
-        # action_list.append(BackAction())
-        # self.action_list.sort()
-        return self.action_list
+        get = action_registry.get
+        return [get(action_id) for action_id in self._order.tolist()]
 
     def get_action_detailed_data(self) -> Tuple[Dict[WindowAction, Any], Any]:
-        return {key: None for key in self.action_list}, None
+        return {key: None for key in self.get_action_list()}, None
 
     def update_action_execution_time(self, action: WindowAction) -> None:
         pass
@@ -42,16 +81,12 @@ class ActionSetState(WindowState):
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, ActionSetState):
-            return (set(self.action_list) == set(other.action_list)) and (self.ability_name == other.ability_name) and (
-                    self.page_path == other.page_path)
+            return (self._hash == other._hash and self.ability_name == other.ability_name
+                    and self.page_path == other.page_path and np.array_equal(self.action_ids, other.action_ids))
         return False
 
     def __hash__(self) -> int:
-        hash_value = 0
-        for action in self.action_list:
-            hash_value += hash(action)
-        hash_value += hash(self.ability_name) + hash(self.page_path)
-        return hash_value
+        return self._hash
 
     def __lt__(self, other: object) -> bool:
         if isinstance(other, ActionSetState):
@@ -60,4 +95,4 @@ class ActionSetState(WindowState):
             return type(self).__name__ < type(other).__name__
 
     def __str__(self) -> str:
-        return f'ActionSetState(action_number={len(self.action_list)}, abilityName={self.ability_name}, pagePath={self.page_path})'
+        return f'ActionSetState(action_number={len(self._order)}, abilityName={self.ability_name}, pagePath={self.page_path})'
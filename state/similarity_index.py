@@ -0,0 +1,91 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from state.impl.action_set_state import ActionSetState
+
+
+class _Partition:
+    def __init__(self, bands: int):
+        self.canonical: List[ActionSetState] = []
+        self.elements: List[frozenset] = []
+        self.signatures: List[np.ndarray] = []
+        self.buckets: List[Dict[bytes, List[int]]] = [dict() for _ in range(bands)]
+
+
+class SimilarityIndex:
+    """
+    Finds the known state whose action set is most similar (Jaccard) to a new one, on the same ability and page.
+
+    States are partitioned by (ability_name, page_path). Within a partition every member (a canonical state
+    or a state merged into it) is indexed by a MinHash signature split into LSH bands, so only members
+    sharing a band with the query are compared exactly. Small partitions are simply scanned.
+    """
+
+    NUM_PERM = 64
+    BANDS = 16
+    PRIME = (1 << 31) - 1
+    SCAN_LIMIT = 32
+
+    def __init__(self, threshold: float = 0.80, seed: int = 1):
+        self.threshold = threshold
+        self.rows = self.NUM_PERM // self.BANDS
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, self.PRIME, self.NUM_PERM, dtype=np.int64)
+        self._b = rng.integers(0, self.PRIME, self.NUM_PERM, dtype=np.int64)
+        self._partitions: Dict[Tuple[str, str], _Partition] = {}
+
+    @staticmethod
+    def _elements(state: ActionSetState) -> frozenset:
+        return frozenset(state.action_ids.tolist())
+
+    def _signature(self, elements: frozenset) -> np.ndarray:
+        if not elements:
+            return np.full(self.NUM_PERM, self.PRIME, dtype=np.int64)
+        x = np.fromiter(elements, dtype=np.int64, count=len(elements)) % self.PRIME
+        return ((np.outer(x, self._a) + self._b) % self.PRIME).min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.BANDS)]
+
+    def add(self, canonical: ActionSetState, member: ActionSetState) -> None:
+        """Index `member` as a state that maps to `canonical` (itself for a new canonical state)."""
+        partition = self._partitions.setdefault((member.ability_name, member.page_path), _Partition(self.BANDS))
+        elements = self._elements(member)
+        signature = self._signature(elements)
+        index = len(partition.canonical)
+        partition.canonical.append(canonical)
+        partition.elements.append(elements)
+        partition.signatures.append(signature)
+        for bucket, key in zip(partition.buckets, self._band_keys(signature)):
+            bucket.setdefault(key, []).append(index)
+
+    def query(self, state: ActionSetState) -> Tuple[ActionSetState, float] | None:
+        """The canonical state of the most similar member at or above the threshold, with the similarity."""
+        partition = self._partitions.get((state.ability_name, state.page_path))
+        if partition is None:
+            return None
+        elements = self._elements(state)
+        if len(partition.canonical) <= self.SCAN_LIMIT:
+            candidates = range(len(partition.canonical))
+        else:
+            candidates = set()
+            for bucket, key in zip(partition.buckets, self._band_keys(self._signature(elements))):
+                candidates.update(bucket.get(key, ()))
+            candidates = sorted(candidates)
+
+        best, best_similarity = None, 0.0
+        for index in candidates:
+            other = partition.elements[index]
+            union = len(elements | other)
+            if union == 0:
+                continue
+            similarity = len(elements & other) / union
+            if similarity >= self.threshold and similarity > best_similarity:
+                best, best_similarity = partition.canonical[index], similarity
+        if best is None:
+            return None
+        return best, best_similarity
+
+    def __len__(self) -> int:
+        return sum(len(partition.canonical) for partition in self._partitions.values())
@@ -5,6 +5,8 @@ from action.window_action import WindowAction
 
 
 class WindowState(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def get_action_list(self) -> List[WindowAction]:
         pass
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import types
+import unittest
+from collections import defaultdict
+
+try:
+    from app_test import AppTest
+except ImportError as e:
+    raise unittest.SkipTest(f"app_test dependencies missing: {e}")
+
+import utils
+from action.impl.back_action import BackAction
+from action.impl.click_action import ClickAction
+from action.element_locator import ElementLocator
+from state.impl.action_set_state import ActionSetState
+from state.similarity_index import SimilarityIndex
+
+
+class _Store:
+    def record_state(self, state, visits=1):
+        pass
+
+    def record_page_visit(self, ability_name, page_path):
+        pass
+
+
+class StartStateTest(unittest.TestCase):
+    def setUp(self):
+        test = AppTest.__new__(AppTest)
+        test.app = "com.example"
+        test.app_metadata = types.SimpleNamespace(main_ability=lambda bundle: "EntryAbility")
+        test.d = types.SimpleNamespace(observation=types.SimpleNamespace(digest="start"))
+        test.state_class = ActionSetState
+        test.lock = threading.Lock()
+        test.state_dict, test.state_log, test.action_dict = {}, [], {}
+        test.ability_count_dict, test.page_count_dict = {}, {}
+        test.similar_states = defaultdict(list)
+        test.all_states = set()
+        test.state_memo = utils.LRUCache(AppTest.STATE_MEMO_SIZE)
+        test.similarity_index = SimilarityIndex(threshold=0.80)
+        test.store = _Store()
+        self.test = test
+
+    def _actions(self, count):
+        return [ClickAction(ElementLocator.XPATH, f"//root[1]/Button[{i}]", i, i, "EntryAbility", "pages/Index")
+                for i in range(count)] + [BackAction("EntryAbility", "pages/Index")]
+
+    def _observe(self, digest, actions):
+        self.test.d.observation.digest = digest
+        return self.test.observe_state(actions, "EntryAbility", "pages/Index")
+
+    def test_near_duplicate_of_start_screen_merges_into_it(self):
+        start_actions = self._actions(9)
+        self.test.enter_start_state(start_actions, "EntryAbility", "pages/Index")
+        start = self.test.current_state
+        self.assertEqual(self.test.state_dict[start], 1)
+        # One button less: 9 of 10 actions shared.
+        self.assertIs(self._observe("near", start_actions[1:]), start)
+        self.assertIs(self._observe("again", start_actions), start)
+
+
+if __name__ == "__main__":
+    unittest.main()
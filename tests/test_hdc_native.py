@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+from hmdriver2._fake_hdc_server import FakeHdcServer
+from hmdriver2._hdc_native import HdcServerClient, HANDSHAKE_BANNER, BANNER_SIZE, _send_packet, _recv_packet
+from hmdriver2.exception import HdcError
+
+SERIAL = "127.0.0.1:5555"
+
+
+class HdcServerClientTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeHdcServer(targets=[SERIAL], files={"/data/local/tmp/layout.json": b'{"ok": 1}'}).start()
+        self.client = HdcServerClient(port=self.fake.port, pool_size=1)
+
+    def tearDown(self):
+        self.client.close()
+        self.fake.stop()
+
+    def _wait_pooled(self, client: HdcServerClient, connect_key: str):
+        deadline = time.monotonic() + 5
+        while not client._pool.get(connect_key):
+            self.assertLess(time.monotonic(), deadline, "pool was not refilled")
+            time.sleep(0.01)
+
+    def test_list_targets(self):
+        self.assertEqual(self.client.list_targets(), [SERIAL])
+        self.fake.targets = []
+        self.assertEqual(self.client.list_targets(), [])
+
+    def test_shell_exit_code(self):
+        result = self.client.shell(SERIAL, "echo hello")
+        self.assertEqual(result.output.strip(), "hello")
+        self.assertEqual(result.exit_code, 0)
+        result = self.client.shell(SERIAL, "echo partial; (exit 3)")
+        self.assertEqual(result.output.strip(), "partial")
+        self.assertEqual(result.exit_code, 3)
+
+    def test_fport(self):
+        self.assertIn("[Empty]", self.client.command("fport ls", SERIAL))
+        self.assertIn("OK", self.client.command("fport tcp:0 tcp:1", SERIAL))
+        self.assertIn("tcp:0 tcp:1", self.client.command("fport ls", SERIAL))
+        self.assertIn("success", self.client.command("fport rm tcp:0 tcp:1", SERIAL))
+        self.assertIn("[Empty]", self.client.command("fport ls", SERIAL))
+
+    def test_file_recv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "layout.json")
+            output = self.client.command(f"file recv /data/local/tmp/layout.json {path}", SERIAL)
+            self.assertIn("FileTransfer finish", output)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b'{"ok": 1}')
+            output = self.client.command(f"file recv /data/local/tmp/missing {path}", SERIAL)
+            self.assertIn("[Fail]", output)
+
+    def test_dropped_pooled_channel_is_retried_once(self):
+        self.client.shell(SERIAL, "true")
+        self._wait_pooled(self.client, SERIAL)
+        self.assertGreaterEqual(self.fake.drop_idle(), 1)
+        commands = len(self.fake.commands)
+        result = self.client.shell(SERIAL, "echo again")
+        self.assertEqual(result.output.strip(), "again")
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(len(self.fake.commands), commands + 1)
+
+    def test_channel_failing_after_reply_is_not_retried(self):
+        listener = socket.create_server(("127.0.0.1", 0))
+        commands = []
+
+        def handle(sock):
+            _send_packet(sock, HANDSHAKE_BANNER.ljust(BANNER_SIZE + 32, b"\0"))
+            _recv_packet(sock)
+            packet = _recv_packet(sock)
+            if packet is not None:
+                commands.append(packet)
+                # Half of a reply packet, then the channel breaks.
+                sock.sendall(struct.pack(">I", 100) + b"parti")
+            sock.close()
+
+        def serve():
+            # One thread per channel: pooled channels wait for their command while others are served.
+            while True:
+                try:
+                    sock, _ = listener.accept()
+                except OSError:
+                    return
+                channel = threading.Thread(target=handle, args=(sock,))
+                channel.daemon = True
+                channel.start()
+
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        client = HdcServerClient(port=listener.getsockname()[1], pool_size=1)
+        try:
+            with self.assertRaises(HdcError):
+                client.command("shell reboot", SERIAL)
+            self._wait_pooled(client, SERIAL)
+            with self.assertRaises(HdcError):
+                client.command("shell reboot", SERIAL)
+            self.assertEqual(len(commands), 2)
+        finally:
+            client.close()
+            listener.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import importlib
-from typing import Any
+from collections import OrderedDict
+from typing import Any, Hashable
 
 
 def instantiate_class_by_module_and_class_name(module_name: str, class_name: str) -> Any:
@@ -19,3 +20,36 @@ def instantiate_class_by_module_and_class_name_and_params(module_name: str, clas
     clazz = getattr(module, class_name)
     instance = clazz(params)
     return instance
+
+
+class LRUCache:
+    """A dict bounded to `maxsize` entries, evicting the least recently used one."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._data:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)